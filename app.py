@@ -2,6 +2,9 @@ import streamlit as st
 import pandas as pd
 import re
 import io
+from roster import (ALL_FLAGS, FLAG_BITS, JAMB_PATTERN, MATRIC_PATTERN, CSVImportError,
+                    EligibilityStats, compact, expanded, flag, pack_flags, read_roster_csv,
+                    set_department)
 
 st.set_page_config(
     page_title="FUTO PCAP",
@@ -432,6 +435,10 @@ CSV_COLS = ["SN", "Name", "Matric_Number", "Jamb_Reg", "Department",
 BOOL_MAP = {"true": True, "1": True, "yes": True,
             "false": False, "0": False, "no": False}
 
+# Result lists are paged server-side and never show more than RESULT_CAP
+# matches, so rendering cost doesn't grow with the number of hits
+RESULT_CAP = 500
+
 # ── Session state ──────────────────────────────────────────────────────────────
 for k, v in {
     "admin_logged_in": False,
@@ -441,7 +448,9 @@ for k, v in {
     "edit_sn": None,
     "confirm_del": None,
     "confirm_clear_all": False,
-    "students_loaded": False,
+    "students_version": 0,
+    "student_search": None,
+    "import_check": None,
     "theme": "light",
 }.items():
     if k not in st.session_state:
@@ -451,46 +460,101 @@ for k, v in {
 st.markdown(DARK_CSS if st.session_state.theme == "dark" else LIGHT_CSS,
             unsafe_allow_html=True)
 
-# ── Auto-load students from GitHub once per session ───────────────────────────
-if not st.session_state.students_loaded:
-    try:
-        from github_store import secrets_configured, load_students, students_to_df
-        if secrets_configured():
-            raw = load_students()
-            if raw:
-                st.session_state.csv_df = students_to_df(raw)
-            st.session_state.students_loaded = True
-    except Exception:
-        pass  # silently fail — app still works, admin can re-upload
-
-# ── Helper: ensure df has SN column and is clean ───────────────────────────────
-def normalise_df(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    if "SN" not in df.columns:
-        df.insert(0, "SN", range(1, len(df) + 1))
-    for c in ["Olevel", "School_Fees", "Jamb"]:
-        if c in df.columns:
-            df[c] = df[c].astype(str).str.strip().str.lower().map(BOOL_MAP)
-    df["SN"] = pd.to_numeric(df["SN"], errors="coerce").fillna(0).astype(int)
-    return df
-
-def persist_students(actor: str, action_note: str = "update"):
-    """Fire-and-forget: queues GitHub write in background. UI never waits."""
+# ── Pick up the shared student dataset (one GitHub fetch per server process) ──
+try:
+    from github_store import secrets_configured, shared_students
+    if secrets_configured():
+        ver, shared_df = shared_students()
+        if ver != st.session_state.students_version:
+            st.session_state.csv_df = shared_df
+            st.session_state.students_version = ver
+except Exception:
+    pass  # silently fail — app still works, admin can re-upload
+
+def persist_students(actor: str, action_note: str = "update",
+                     op: str = None, sns: list = ()):
+    """Queues the GitHub write in background, then publishes the session's
+    DataFrame to every session. UI never waits. Call it after append_log so
+    the audit entry is committed together with the records.
+    op ("add", "edit" or "delete") and sns name the records that changed, so
+    only those are journalled; without op the whole dataset is rewritten.
+    (Queueing first keeps the shared-dataset revalidation from reloading
+    the stored files in between and dropping the change.)"""
     try:
-        from github_store import df_to_students, save_students
+        from github_store import (df_to_students, save_students, journal_students,
+                                  publish_students)
         df = st.session_state.csv_df
-        records = df_to_students(df) if df is not None and not df.empty else []
-        save_students(records, actor=actor, action_note=action_note)
+        if op == "delete":
+            journal_students(op, [{"SN": int(sn)} for sn in sns], actor, action_note)
+        elif op is not None:
+            journal_students(op, df_to_students(df[df["SN"].isin(sns)]), actor, action_note)
+        else:
+            records = df_to_students(df) if df is not None and not df.empty else []
+            save_students(records, actor=actor, action_note=action_note)
+        st.session_state.students_version = publish_students(
+            df, sns if op is not None else None)
     except Exception:
         pass  # Background write failure is silent — data is safe in session state
 
+def _eta_text(eta) -> str:
+    """', ~40s' / ', ~3 min' suffix for the sync indicator."""
+    if eta is None:
+        return ""
+    return f", ~{max(1, round(eta))}s" if eta < 90 else f", ~{round(eta / 60)} min"
+
+def backup_diff(current: pd.DataFrame, backup: pd.DataFrame):
+    """What restoring backup over current would do, matched on SN.
+    Returns (added, removed, changed) — changed lists the backup's version."""
+    cols = [c for c in CSV_COLS if c != "SN"]
+    empty = pd.DataFrame(columns=CSV_COLS)
+    cur = expanded(current)[CSV_COLS] if current is not None and not current.empty else empty
+    bak = expanded(backup)[CSV_COLS] if backup is not None and not backup.empty else empty
+    merged = cur.merge(bak, on="SN", how="outer", suffixes=("_cur", ""), indicator=True)
+    added   = merged.loc[merged["_merge"] == "right_only", CSV_COLS]
+    removed = cur[cur["SN"].isin(merged.loc[merged["_merge"] == "left_only", "SN"])]
+    both    = merged[merged["_merge"] == "both"]
+    differs = pd.Series(False, index=both.index)
+    for c in cols:
+        differs |= both[c].astype(str) != both[f"{c}_cur"].astype(str)
+    changed = both.loc[differs, CSV_COLS]
+    return (added.reset_index(drop=True), removed.reset_index(drop=True),
+            changed.reset_index(drop=True))
+
 def next_sn(df: pd.DataFrame) -> int:
     if df is None or df.empty or "SN" not in df.columns:
         return 1
     return int(df["SN"].max()) + 1
 
 def df_to_csv_bytes(df: pd.DataFrame) -> bytes:
-    return df.to_csv(index=False).encode("utf-8")
+    return expanded(df).to_csv(index=False).encode("utf-8")
+
+def html_escape(col: pd.Series) -> pd.Series:
+    """A column as HTML-safe text, escaped in one vectorised pass."""
+    return (col.astype(str).astype(object).str.replace("&", "&amp;", regex=False)
+            .str.replace("<", "&lt;", regex=False).str.replace(">", "&gt;", regex=False)
+            .str.replace("'", "&#39;", regex=False).str.replace('"', "&quot;", regex=False))
+
+def paginate(total: int, page_size: int, key: str, query) -> tuple:
+    """
+    (start, stop) of the page to render out of the first RESULT_CAP of
+    total results, with a page picker and a "showing x–y of n" caption.
+    The page resets to 1 whenever query (whatever produced the results)
+    changes.
+    """
+    if total == 0:
+        return 0, 0
+    shown = min(total, RESULT_CAP)
+    pages = max(1, -(-shown // page_size))
+    if st.session_state.get(f"{key}_query") != query or st.session_state.get(key, 1) > pages:
+        st.session_state[f"{key}_query"] = query
+        st.session_state[key] = 1
+    page = (st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, step=1, key=key)
+            if pages > 1 else 1)
+    start, stop = (page - 1) * page_size, min(page * page_size, shown)
+    capped = (f" — only the first {RESULT_CAP} of {total} are listed, refine your search"
+              if total > RESULT_CAP else f" of {total}")
+    st.caption(f"Showing {start + 1}–{stop}{capped}")
+    return start, stop
 
 # ── Header ─────────────────────────────────────────────────────────────────────
 st.markdown(
@@ -530,11 +594,14 @@ nav_l, nav_mid, nav_r = st.columns([3.5, 1.1, 1.4])
 with nav_l:
     if st.session_state.admin_logged_in:
         try:
-            from github_store import _write_queue, _queue_lock
-            with _queue_lock:
-                pending = len(_write_queue)
-            if pending > 0:
-                st.caption(f"⏳ Syncing… ({pending} pending)")
+            from github_store import sync_status
+            sync = sync_status()
+            if sync["failed"]:
+                st.caption(f"⚠️ {sync['failed']} write(s) failed — see Admin Panel")
+            elif sync["retrying"]:
+                st.caption(f"🔁 Retrying… ({sync['pending']} pending{_eta_text(sync['eta'])})")
+            elif sync["pending"] > 0:
+                st.caption(f"⏳ Syncing… ({sync['pending']} pending{_eta_text(sync['eta'])})")
             else:
                 st.caption("✅ Synced")
         except Exception:
@@ -602,6 +669,10 @@ token = "ghp_your_token_here"
 repo  = "your_github_username/pcap-data"
 admins_path = "admins.json"</pre>
 <p>Save and reboot the app.</p>
+<p>To run offline instead, store data on local disk with:</p>
+<pre>[store]
+backend    = "local"
+local_root = "pcap_data"</pre>
 </div>
 """, unsafe_allow_html=True)
 
@@ -623,75 +694,89 @@ def student_view():
     st.caption("Search by Surname, full name, 11-digit Matric Number, or 12-character JAMB Reg Number.")
     search_term = st.text_input("Search", placeholder="e.g. Okafor  |  20251515463  |  202550551834BF",
                                 label_visibility="collapsed")
+    fuzzy = st.checkbox("Not sure of the spelling? Show the closest names",
+                        help="Lists the few names nearest to what you typed, allowing for typos.")
     search_btn = st.button("Check Status")
 
-    if not search_btn:
+    # The last checked search is kept so paging through its results (a rerun)
+    # doesn't clear them
+    if search_btn:
+        st.session_state.student_search = (search_term.strip(), fuzzy) if search_term.strip() else None
+        if not search_term.strip():
+            st.warning("Please enter a search term.")
+            return
+    if st.session_state.student_search is None:
         return
-    if not search_term.strip():
-        st.warning("Please enter a search term.")
-        return
-
-    term = search_term.strip().lower()
-    mask = (
-        df["Name"].astype(str).str.lower().str.contains(term, na=False)
-        | df["Matric_Number"].astype(str).str.lower().str.contains(term, na=False)
-        | df["Jamb_Reg"].astype(str).str.lower().str.contains(term, na=False)
-    )
-    results = df[mask]
+    search_term, fuzzy = st.session_state.student_search
+
+    # Exact Matric / JAMB numbers come from the per-version index; anything
+    # else is treated as a name, matched exactly or (opted in) approximately
+    from github_store import find_by_key, search_students, fuzzy_search_students
+    version = st.session_state.students_version
+    results = find_by_key(version, df, search_term)
+    by_name = results is None
+    closest = by_name and fuzzy
+    if by_name:
+        results = (fuzzy_search_students(version, df, search_term) if closest
+                   else search_students(version, df, search_term, ("Name",)))
 
     if results.empty:
         st.warning("No record found. Please verify your details or contact the Admissions Office.")
+        if by_name and not closest:
+            st.caption("Tip: tick \"Show the closest names\" above if you may have misspelt the name.")
         return
 
-    st.markdown(f"**{len(results)} record(s) found:**")
-    for _, row in results.iterrows():
-        olvl  = row["Olevel"] is True
-        fees  = row["School_Fees"] is True
-        jamb  = row["Jamb"] is True
-        name  = str(row["Name"])
-        dept  = str(row["Department"])
-        mat   = str(row["Matric_Number"])
-        jreg  = str(row["Jamb_Reg"])
-        valid = olvl and fees and jamb
-
-        if valid:
-            st.markdown(
-                f"<div class='ok-card'>"
-                f"<h3>{name} &nbsp;<span class='badge-eligible'>ELIGIBLE</span></h3>"
-                f"<p>\U0001F393 Department: <strong>{dept}</strong></p>"
-                f"<p>\U0001F194 Matric Number: <strong>{mat}</strong></p>"
-                f"<p>\U0001F4DD JAMB Reg: <strong>{jreg}</strong></p>"
-                f"</div>"
-                f"<div class='notice'>"
-                f"\U0001F3EB You are ELIGIBLE for Physical Clearance. "
-                f"Please proceed to the designated clearance venue with all original documents. "
-                f"Your record will be verified on arrival."
-                f"</div>",
-                unsafe_allow_html=True,
-            )
-        else:
-            ih = ""
-            if not fees:
-                ih += ("<p><strong>\U0001F4B3 School Fees Not Paid</strong> &mdash; "
-                       "Pay via the university payment portal and allow 24&ndash;48 hours for confirmation.</p>")
-            if not jamb:
-                ih += ("<p><strong>\U0001F4CB JAMB Admission Not Confirmed</strong> &mdash; "
-                       "Visit <em>jamb.gov.ng</em> or the Admissions Office to confirm your admission.</p>")
-            if not olvl:
-                ih += ("<p><strong>\U0001F4DA O&rsquo;Level Results Not Verified</strong> &mdash; "
-                       "Submit your original result(s) to the Admissions Office. "
-                       "Wait a little longer if recently submitted.</p>")
-            st.markdown(
-                f"<div class='err-card'>"
-                f"<h4>\u274C Not Yet Eligible &mdash; {name}</h4>"
-                f"<p>Matric: <strong>{mat}</strong> &nbsp;|&nbsp; JAMB: <strong>{jreg}</strong></p>"
-                f"<hr style='border:0;border-top:1px solid #f5c6c6;margin:.6rem 0'>"
-                f"<p><strong>Action required:</strong></p>{ih}"
-                f"<p style='color:#888;font-size:.84rem;margin-top:.4rem'>"
-                f"Resolve the above and check again. Contact the Admissions Office if you believe this is an error.</p>"
-                f"</div>",
-                unsafe_allow_html=True,
-            )
+    if closest:
+        st.markdown(f"**Closest {len(results)} name(s) to \u201c{search_term}\u201d, best match first:**")
+    else:
+        st.markdown(f"**{len(results)} record(s) found:**")
+    start, stop = paginate(len(results), 10, "student_page", (version, search_term, fuzzy))
+    st.markdown(_student_cards_html(results.iloc[start:stop]), unsafe_allow_html=True)
+
+
+def _student_cards_html(rows: pd.DataFrame) -> str:
+    """Eligibility cards for rows, built column-wise into one HTML block."""
+    flags = rows["Flags"].astype(int)
+    name, dept = html_escape(rows["Name"]), html_escape(rows["Department"])
+    mat, jreg  = html_escape(rows["Matric_Number"]), html_escape(rows["Jamb_Reg"])
+
+    def unless(req, text):
+        return ((flags & FLAG_BITS[req]) != 0).map({True: "", False: text})
+
+    ok = (
+        "<div class='ok-card'>"
+        "<h3>" + name + " &nbsp;<span class='badge-eligible'>ELIGIBLE</span></h3>"
+        "<p>\U0001F393 Department: <strong>" + dept + "</strong></p>"
+        "<p>\U0001F194 Matric Number: <strong>" + mat + "</strong></p>"
+        "<p>\U0001F4DD JAMB Reg: <strong>" + jreg + "</strong></p>"
+        "</div>"
+        "<div class='notice'>"
+        "\U0001F3EB You are ELIGIBLE for Physical Clearance. "
+        "Please proceed to the designated clearance venue with all original documents. "
+        "Your record will be verified on arrival."
+        "</div>"
+    )
+    ih = (unless("School_Fees",
+                 "<p><strong>\U0001F4B3 School Fees Not Paid</strong> &mdash; "
+                 "Pay via the university payment portal and allow 24&ndash;48 hours for confirmation.</p>")
+          + unless("Jamb",
+                   "<p><strong>\U0001F4CB JAMB Admission Not Confirmed</strong> &mdash; "
+                   "Visit <em>jamb.gov.ng</em> or the Admissions Office to confirm your admission.</p>")
+          + unless("Olevel",
+                   "<p><strong>\U0001F4DA O&rsquo;Level Results Not Verified</strong> &mdash; "
+                   "Submit your original result(s) to the Admissions Office. "
+                   "Wait a little longer if recently submitted.</p>"))
+    pending = (
+        "<div class='err-card'>"
+        "<h4>\u274C Not Yet Eligible &mdash; " + name + "</h4>"
+        "<p>Matric: <strong>" + mat + "</strong> &nbsp;|&nbsp; JAMB: <strong>" + jreg + "</strong></p>"
+        "<hr style='border:0;border-top:1px solid #f5c6c6;margin:.6rem 0'>"
+        "<p><strong>Action required:</strong></p>" + ih +
+        "<p style='color:#888;font-size:.84rem;margin-top:.4rem'>"
+        "Resolve the above and check again. Contact the Admissions Office if you believe this is an error.</p>"
+        "</div>"
+    )
+    return "".join(ok.where(flags == ALL_FLAGS, pending))
 
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -787,12 +872,16 @@ def admin_panel_view():
         unsafe_allow_html=True,
     )
 
-    tab1, tab2, tab3, tab4, tab5 = st.tabs([
+    _render_failed_writes()
+
+    tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs([
         "\U0001F4CB Student Records",
         "\U0001F4C2 Import CSV",
         "\U0001F468\u200D\U0001F4BB Manage Admins",
         "\U0001F510 My Account",
         "\U0001F4DC Audit Logs",
+        "\U0001F5C4\uFE0F Backups",
+        "\U0001F4CA Dashboard",
     ])
 
     # ══════════════════════════════════════════════════════════════════════════
@@ -803,11 +892,12 @@ def admin_panel_view():
 
         # ── Stats bar ──────────────────────────────────────────────────────
         if df is not None and not df.empty:
-            eligible = df[(df["Olevel"]==True)&(df["School_Fees"]==True)&(df["Jamb"]==True)]
+            from github_store import eligibility_stats
+            stats = eligibility_stats(st.session_state.students_version, df)
             c1, c2, c3 = st.columns(3)
-            c1.metric("Total Students", len(df))
-            c2.metric("Eligible", len(eligible))
-            c3.metric("Pending", len(df) - len(eligible))
+            c1.metric("Total Students", stats.total)
+            c2.metric("Eligible", stats.eligible)
+            c3.metric("Pending", stats.total - stats.eligible)
             st.divider()
 
         # ── Search ─────────────────────────────────────────────────────────
@@ -817,17 +907,13 @@ def admin_panel_view():
                               key="admin_search", placeholder="e.g. Okafor or 20251515463")
 
         if df is not None and not df.empty and srch.strip():
-            t = srch.strip().lower()
-            mask = pd.Series([False]*len(df), index=df.index)
-            for col in ["SN","Name","Matric_Number","Jamb_Reg","Department"]:
-                if col in df.columns:
-                    mask |= df[col].astype(str).str.lower().str.contains(t, na=False)
-            found = df[mask]
+            from github_store import search_students
+            found = search_students(st.session_state.students_version, df, srch)
             if found.empty:
                 st.warning("No students match your search.")
             else:
                 st.caption(f"{len(found)} result(s) — note the S/N to edit or delete")
-                _render_search_results(found)
+                _render_search_results(found, srch)
         elif df is not None and not df.empty and not srch.strip():
             st.info(f"\U0001F4CB {len(df)} students loaded. Use the search box above to find a student.")
         else:
@@ -914,9 +1000,9 @@ def admin_panel_view():
             errs = []
             if not a_surname.strip():  errs.append("Surname is required.")
             if not a_first.strip():    errs.append("First name is required.")
-            if not re.match(r"^\d{11}$", a_matric.strip()):
+            if not MATRIC_PATTERN.match(a_matric.strip()):
                 errs.append("Matric Number must be exactly 11 digits.")
-            if not re.match(r"^\d{12}[A-Za-z]{2}$", a_jamb.strip()):
+            if not JAMB_PATTERN.match(a_jamb.strip()):
                 errs.append("JAMB Reg must be 12 digits followed by 2 letters.")
             if df is not None and not df.empty:
                 if a_matric.strip() in df["Matric_Number"].astype(str).values:
@@ -937,17 +1023,14 @@ def admin_panel_view():
                     "Matric_Number": a_matric.strip(),
                     "Jamb_Reg": a_jamb.strip().upper(),
                     "Department": a_dept,
-                    "Olevel": a_olevel == "True",
-                    "School_Fees": a_fees == "True",
-                    "Jamb": a_jamb_s == "True",
+                    "Flags": pack_flags(a_olevel == "True", a_fees == "True", a_jamb_s == "True"),
                 }
                 if df is None or df.empty:
-                    st.session_state.csv_df = pd.DataFrame([new_row])
+                    st.session_state.csv_df = compact(pd.DataFrame([new_row]))
                 else:
-                    st.session_state.csv_df = pd.concat(
+                    st.session_state.csv_df = compact(pd.concat(
                         [df, pd.DataFrame([new_row])], ignore_index=True
-                    )
-                persist_students(admin["username"], f"add SN {new_sn}")
+                    ))
                 try:
                     from github_store import append_log
                     append_log(admin["username"], "ADD_STUDENT",
@@ -955,6 +1038,7 @@ def admin_panel_view():
                                f"JAMB: {a_jamb.strip().upper()} | Dept: {a_dept} | S/N: {new_sn}")
                 except Exception:
                     pass
+                persist_students(admin["username"], f"add SN {new_sn}", "add", [new_sn])
                 st.success(f"\u2705 {full_name} added with S/N {new_sn}.")
                 st.rerun()
 
@@ -981,8 +1065,8 @@ def admin_panel_view():
                     "<div style='background:#fff0f0;border-left:4px solid #cc0000;"
                     "border-radius:8px;padding:.8rem 1rem;margin:.5rem 0'>"
                     "<strong>\u26A0\uFE0F DANGER: Delete ALL student records?</strong><br>"
-                    "<span style='font-size:.85rem;color:#666'>A backup will be automatically "
-                    "saved to GitHub before deletion.</span></div>",
+                    "<span style='font-size:.85rem;color:#666'>A backup is taken first and "
+                    "uploaded to GitHub in the background (see the sync indicator).</span></div>",
                     unsafe_allow_html=True,
                 )
                 ca1, ca2 = st.columns(2)
@@ -991,10 +1075,12 @@ def admin_panel_view():
                                  key="confirm_clear_yes", use_container_width=True):
                         try:
                             from github_store import clear_all_students
+                            from github_store import publish_students
                             backup_file = clear_all_students(admin["username"])
                             st.session_state.csv_df = None
+                            st.session_state.students_version = publish_students(None)
                             st.session_state.confirm_clear_all = False
-                            st.success(f"\u2705 All records deleted. Backup: `{backup_file}`")
+                            st.success(f"\u2705 All records deleted. Backup queued: `{backup_file}`")
                             st.rerun()
                         except Exception as e:
                             st.error(f"Error during clear: {e}")
@@ -1015,39 +1101,60 @@ def admin_panel_view():
             "<code>Name</code>, <code>Matric_Number</code>, <code>Jamb_Reg</code>, "
             "<code>Department</code>, <code>Olevel</code>, <code>School_Fees</code>, <code>Jamb</code>"
             "<br>Optional: <code>SN</code> (will be auto-assigned if missing)"
+            "<br>Rows with an invalid or duplicate Matric/JAMB number, an unknown department "
+            "or an unreadable true/false value are left out and listed in a downloadable report."
             "</div>",
             unsafe_allow_html=True,
         )
         uploaded = st.file_uploader("Upload CSV", type=["csv"], key="admin_csv_import")
-        if uploaded:
-            try:
-                raw = pd.read_csv(uploaded)
-                raw.columns = raw.columns.str.strip()
-                required = {"Name","Matric_Number","Jamb_Reg","Department","Olevel","School_Fees","Jamb"}
-                missing = required - set(raw.columns)
-                if missing:
-                    st.error(f"Missing columns: {', '.join(sorted(missing))}")
-                else:
-                    bad_m = raw[~raw["Matric_Number"].astype(str).str.match(r"^\d{11}$")]
-                    bad_j = raw[~raw["Jamb_Reg"].astype(str).str.match(r"^\d{12}[A-Za-z]{2}$")]
-                    if not bad_m.empty:
-                        st.warning(f"\u26A0\uFE0F {len(bad_m)} invalid Matric Number(s): {bad_m['Name'].tolist()}")
-                    if not bad_j.empty:
-                        st.warning(f"\u26A0\uFE0F {len(bad_j)} invalid JAMB Reg(s): {bad_j['Name'].tolist()}")
-                    clean = normalise_df(raw)
-                    st.session_state.csv_df = clean
-                    persist_students(admin["username"], f"import CSV {len(clean)} records")
+        if uploaded is None:
+            st.session_state.import_check = None
+        else:
+            # Validated once per uploaded file, then kept across reruns until imported
+            check = st.session_state.import_check
+            if check is None or check[0] != uploaded.file_id:
+                try:
+                    with st.spinner("Validating…"):
+                        valid, rejected = read_roster_csv(uploaded, DEPARTMENTS, BOOL_MAP)
+                    check = (uploaded.file_id, valid, rejected,
+                             EligibilityStats.build(valid).eligible, False)
+                except CSVImportError as e:
+                    check = (uploaded.file_id, None, None, 0, False)
+                    st.error(str(e))
+                st.session_state.import_check = check
+            _, valid, rejected, eligible_n, imported = check
+
+            if valid is not None:
+                v1, v2 = st.columns(2)
+                v1.metric("Valid rows", len(valid))
+                v2.metric("Rejected rows", len(rejected))
+                if not rejected.empty:
+                    st.warning(f"\u26A0\uFE0F {len(rejected)} row(s) will not be imported. "
+                               "Download the report, fix them and upload again.")
+                    st.dataframe(rejected.head(200), use_container_width=True, hide_index=True)
+                    st.download_button(
+                        "\U0001F4E5 Download Rejected Rows", rejected.to_csv(index=False).encode("utf-8"),
+                        file_name="pcap_import_rejected.csv", mime="text/csv",
+                        use_container_width=True,
+                    )
+                if imported:
+                    st.success(f"\u2705 Imported {len(valid)} records — {eligible_n} eligible.")
+                    st.dataframe(expanded(valid.head(200)), use_container_width=True, hide_index=True)
+                elif not valid.empty and st.button(
+                        f"\U0001F4C2 Replace All Records with {len(valid)} Valid Row(s)",
+                        use_container_width=True, key="import_csv_btn"):
+                    st.session_state.csv_df = valid
                     try:
                         from github_store import append_log
+                        note = f" ({len(rejected)} rejected)" if not rejected.empty else ""
                         append_log(admin["username"], "IMPORT_CSV",
-                                   f"Imported {len(clean)} student records via CSV upload")
+                                   f"Imported {len(valid)} student records via CSV upload{note}")
                     except Exception:
                         pass
-                    eligible_n = len(clean[(clean["Olevel"]==True)&(clean["School_Fees"]==True)&(clean["Jamb"]==True)])
-                    st.success(f"\u2705 Imported {len(clean)} records — {eligible_n} eligible.")
-                    st.dataframe(clean, use_container_width=True)
-            except Exception as e:
-                st.error(f"Error reading CSV: {e}")
+                    persist_students(admin["username"], f"import CSV {len(valid)} records")
+                    st.session_state.import_check = (uploaded.file_id, valid, rejected,
+                                                     eligible_n, True)
+                    st.rerun()
 
     # ══════════════════════════════════════════════════════════════════════════
     # TAB 3 — MANAGE ADMINS
@@ -1162,17 +1269,26 @@ def admin_panel_view():
             "ALL", "LOGIN", "LOGIN_FAILED", "LOGOUT",
             "ADD_STUDENT", "EDIT_STUDENT", "DELETE_STUDENT",
             "IMPORT_CSV", "CLEAR_ALL_STUDENTS", "BACKUP_CREATED",
-            "CREATE_ADMIN", "UPDATE_OWN_CREDENTIALS",
+            "RESTORE_BACKUP", "CREATE_ADMIN", "UPDATE_OWN_CREDENTIALS",
         ]
-        log_col1, log_col2 = st.columns([2, 1])
+        LOG_PERIODS = {"Last 24 hours": 1, "Last 7 days": 7, "Last 30 days": 30, "All time": None}
+        log_col1, log_col2, log_col3 = st.columns([2, 1, 1])
         with log_col1:
             actor_filter = st.text_input("Filter by admin username", placeholder="Leave blank for all")
         with log_col2:
             action_filter = st.selectbox("Filter by action", ACTION_TYPES)
+        with log_col3:
+            period = st.selectbox("Period", list(LOG_PERIODS), index=1)
 
         try:
             from github_store import load_logs
-            all_logs = load_logs()
+            from datetime import datetime, timedelta, timezone
+            days  = LOG_PERIODS[period]
+            since = None
+            if days is not None:
+                since = (datetime.now(timezone.utc) - timedelta(days=days)
+                         ).strftime("%Y-%m-%d %H:%M:%S UTC")
+            all_logs = load_logs(since=since)
         except Exception as e:
             st.error(f"Could not load logs: {e}")
             all_logs = []
@@ -1184,7 +1300,7 @@ def admin_panel_view():
             if action_filter != "ALL":
                 filtered = [l for l in filtered if l.get("action","") == action_filter]
 
-            st.caption(f"Showing {len(filtered)} of {len(all_logs)} total log entries")
+            st.caption(f"{len(filtered)} of {len(all_logs)} total log entries match")
 
             # Colour map for action types
             ACTION_COLORS = {
@@ -1193,28 +1309,31 @@ def admin_panel_view():
                 "ADD_STUDENT": "#0055cc", "EDIT_STUDENT": "#ff8800",
                 "DELETE_STUDENT": "#cc0000", "CLEAR_ALL_STUDENTS": "#990000",
                 "IMPORT_CSV": "#0055cc", "BACKUP_CREATED": "#006633",
+                "RESTORE_BACKUP": "#990066",
                 "CREATE_ADMIN": "#6600cc", "UPDATE_OWN_CREDENTIALS": "#cc6600",
             }
 
-            for entry in filtered:
-                action = entry.get("action", "")
-                color  = ACTION_COLORS.get(action, "#333")
-                st.markdown(
-                    f"<div style='border-left:3px solid {color};background:#fafafa;"
-                    f"border-radius:6px;padding:.5rem .9rem;margin-bottom:.35rem;font-size:.87rem'>"
-                    f"<div style='display:flex;justify-content:space-between;flex-wrap:wrap;gap:.3rem'>"
-                    f"<span><strong style='color:{color}'>{action}</strong> &nbsp;&mdash;&nbsp; "
-                    f"<strong>{entry.get('actor','?')}</strong></span>"
-                    f"<span style='color:#888;font-size:.8rem'>{entry.get('timestamp','')}</span>"
-                    f"</div>"
-                    f"<div style='color:#555;margin-top:.2rem'>{entry.get('detail','')}</div>"
-                    f"</div>",
-                    unsafe_allow_html=True,
-                )
+            log_df = pd.DataFrame(filtered)
+            start, stop = paginate(len(log_df), 50, "log_page",
+                                   (actor_filter.strip().lower(), action_filter, period))
+            page = log_df.iloc[start:stop].reindex(columns=["action", "actor", "timestamp", "detail"])
+            action = page["action"].fillna("")
+            color  = action.map(ACTION_COLORS).fillna("#333")
+            entries = (
+                "<div style='border-left:3px solid " + color + ";background:#fafafa;"
+                "border-radius:6px;padding:.5rem .9rem;margin-bottom:.35rem;font-size:.87rem'>"
+                "<div style='display:flex;justify-content:space-between;flex-wrap:wrap;gap:.3rem'>"
+                "<span><strong style='color:" + color + "'>" + html_escape(action) + "</strong> &nbsp;&mdash;&nbsp; "
+                "<strong>" + html_escape(page["actor"].fillna("?")) + "</strong></span>"
+                "<span style='color:#888;font-size:.8rem'>" + html_escape(page["timestamp"].fillna("")) + "</span>"
+                "</div>"
+                "<div style='color:#555;margin-top:.2rem'>" + html_escape(page["detail"].fillna("")) + "</div>"
+                "</div>"
+            )
+            st.markdown("".join(entries), unsafe_allow_html=True)
 
             # Download logs as CSV
             import io as _io
-            log_df = pd.DataFrame(filtered)
             log_csv = log_df.to_csv(index=False).encode("utf-8")
             st.download_button(
                 "\U0001F4E5 Download Log as CSV", log_csv,
@@ -1223,41 +1342,184 @@ def admin_panel_view():
             )
         else:
             st.info("No log entries yet.")
-def _render_search_results(df: pd.DataFrame):
-    """Display search results as a clean read-only styled table."""
-    for _, row in df.iterrows():
-        sn   = int(row["SN"])
-        olvl = row["Olevel"] is True
-        fees = row["School_Fees"] is True
-        jamb = row["Jamb"] is True
-        valid = olvl and fees and jamb
-        border_color = "#006633" if valid else "#cc0000"
-        status_badge = (
-            "<span style='background:#006633;color:#fff;border-radius:12px;"
-            "padding:2px 10px;font-size:.75rem;font-weight:600'>ELIGIBLE</span>"
-            if valid else
-            "<span style='background:#cc0000;color:#fff;border-radius:12px;"
-            "padding:2px 10px;font-size:.75rem;font-weight:600'>PENDING</span>"
-        )
-        st.markdown(
-            f"<div style='border-left:4px solid {border_color};background:#fafafa;"
-            f"border-radius:8px;padding:.7rem 1rem;margin-bottom:.5rem'>"
-            f"<div style='display:flex;justify-content:space-between;align-items:center'>"
-            f"<span style='font-weight:700;font-size:1rem'>{row['Name']}</span>"
-            f"<span style='display:flex;gap:.5rem;align-items:center'>"
-            f"<span style='background:#e8f5e9;color:#006633;border-radius:12px;"
-            f"padding:2px 10px;font-size:.8rem;font-weight:700'>S/N {sn}</span>"
-            f"{status_badge}</span></div>"
-            f"<div style='margin-top:.4rem;font-size:.85rem;color:#555;display:flex;flex-wrap:wrap;gap:.8rem'>"
-            f"<span>\U0001F393 {row['Department']}</span>"
-            f"<span>\U0001F194 {row['Matric_Number']}</span>"
-            f"<span>\U0001F4DD {row['Jamb_Reg']}</span>"
-            f"<span>O'Level {'✅' if olvl else '❌'}</span>"
-            f"<span>Fees {'✅' if fees else '❌'}</span>"
-            f"<span>JAMB {'✅' if jamb else '❌'}</span>"
-            f"</div></div>",
-            unsafe_allow_html=True,
-        )
+
+    # ══════════════════════════════════════════════════════════════════════════
+    # TAB 6 — BACKUPS (catalogue, preview, restore)
+    # ══════════════════════════════════════════════════════════════════════════
+    with tab6:
+        st.markdown("##### \U0001F5C4\uFE0F Backups")
+        st.caption("Restoring replaces every current record. The current records are "
+                   "backed up automatically first, so a restore can itself be undone.")
+
+        if st.button("\U0001F4BE Back Up Current Records Now", key="backup_now_btn"):
+            try:
+                from github_store import backup_students, df_to_students
+                cur = st.session_state.csv_df
+                records = df_to_students(cur) if cur is not None and not cur.empty else []
+                st.success(f"\u2705 Backup queued: `{backup_students(records, admin['username'])}`")
+            except Exception as e:
+                st.error(f"Backup failed: {e}")
+
+        try:
+            from github_store import list_backups
+            backups = list_backups()
+        except Exception as e:
+            st.error(f"Could not load backups: {e}")
+            backups = []
+
+        if not backups:
+            st.info("No backups yet.")
+        else:
+            labels = {
+                b["file"]: (f"{b.get('backed_up_at') or 'unknown time'} — "
+                            f"{'?' if b.get('student_count') is None else b['student_count']} records"
+                            + (f" — by {b['backed_up_by']}" if b.get("backed_up_by") else ""))
+                for b in backups
+            }
+            chosen = st.selectbox("Backup", list(labels), format_func=labels.get,
+                                  key="backup_choice")
+            if st.button("\U0001F50D Preview Restore", key="backup_preview_btn"):
+                try:
+                    from github_store import load_backup, students_to_df
+                    st.session_state.backup_preview = (chosen, students_to_df(load_backup(chosen)))
+                except Exception as e:
+                    st.error(f"Could not load backup: {e}")
+
+            preview = st.session_state.get("backup_preview")
+            if preview and preview[0] == chosen:
+                bak_df = preview[1]
+                added, removed, changed = backup_diff(st.session_state.csv_df, bak_df)
+                m1, m2, m3 = st.columns(3)
+                m1.metric("Would be added", len(added))
+                m2.metric("Would be removed", len(removed))
+                m3.metric("Would change", len(changed))
+                for title, part in (("Added", added), ("Removed", removed), ("Changed (backup version)", changed)):
+                    if not part.empty:
+                        with st.expander(f"{title} — {len(part)}"):
+                            st.dataframe(part, use_container_width=True, hide_index=True)
+
+                sure = st.checkbox(f"Replace all current records with this backup "
+                                   f"({0 if bak_df is None else len(bak_df)} records)",
+                                   key="backup_restore_sure")
+                if st.button("\u267B\uFE0F Restore This Backup", key="backup_restore_btn",
+                             disabled=not sure, use_container_width=True):
+                    try:
+                        from github_store import restore_backup, publish_students, students_to_df
+                        with st.spinner("Restoring… (reads the backup one chunk at a time)"):
+                            restored, safety = restore_backup(chosen, admin["username"])
+                        new_df = students_to_df(restored)
+                        st.session_state.csv_df = new_df
+                        st.session_state.students_version = publish_students(new_df)
+                        st.session_state.backup_preview = None
+                        st.success(f"\u2705 Restored {len(restored)} records. "
+                                   f"Previous data backup queued: `{safety}`.")
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"Restore failed: {e}")
+
+    # ══════════════════════════════════════════════════════════════════════════
+    # TAB 7 — ELIGIBILITY DASHBOARD
+    # ══════════════════════════════════════════════════════════════════════════
+    with tab7:
+        st.markdown("##### \U0001F4CA Eligibility by Department")
+        df = st.session_state.csv_df
+        if df is None or df.empty:
+            st.info("No student records loaded yet.")
+        else:
+            from github_store import eligibility_stats
+            from roster import STAT_LABELS
+            stats = eligibility_stats(st.session_state.students_version, df)
+            missing = stats.missing()
+            d1, d2, d3, d4, d5 = st.columns(5)
+            d1.metric("Students", stats.total)
+            d2.metric("Eligible", stats.eligible,
+                      f"{100 * stats.eligible / stats.total:.1f}%" if stats.total else None,
+                      delta_color="off")
+            for col, (req, label) in zip((d3, d4, d5), STAT_LABELS.items()):
+                col.metric(label, missing[req])
+            st.caption("A student missing several requirements is counted under each of them.")
+
+            table = stats.by_department()
+            blocked = table[table["Pending"] > 0].head(15)
+            if not blocked.empty:
+                st.markdown("**Most pending students — what they are missing**")
+                st.bar_chart(blocked.set_index("Department")[list(STAT_LABELS.values())])
+            st.dataframe(table, use_container_width=True, hide_index=True,
+                         column_config={"% Eligible": st.column_config.ProgressColumn(
+                             "% Eligible", min_value=0, max_value=100, format="%.1f%%")})
+
+
+def _render_failed_writes():
+    """Writes GitHub kept rejecting — shown so nothing is lost silently."""
+    try:
+        from github_store import dead_letters, replay_dead_letter, discard_dead_letter
+        failed = dead_letters()
+    except Exception:
+        return
+    if not failed:
+        return
+    with st.expander(f"⚠️ {len(failed)} GitHub write(s) failed", expanded=True):
+        st.caption("These changes are live in the app but were not saved to GitHub. "
+                   "Replay them once GitHub is reachable again.")
+        # Labels, notes and errors carry user and server text — escape them
+        shown = pd.DataFrame(failed)
+        label, when, error = (html_escape(shown[c]) for c in ("label", "failed_at", "error"))
+        notes = html_escape(shown["notes"].map("; ".join))
+        for i, d in enumerate(failed):
+            fc1, fc2, fc3 = st.columns([4, 1, 1])
+            with fc1:
+                note = f" — {notes[i]}" if d["notes"] else ""
+                st.markdown(
+                    f"<div style='font-size:.85rem'><strong>{label[i]}</strong>{note}<br>"
+                    f"<span style='color:#888'>{when[i]} · {d['attempts']} attempt(s) · "
+                    f"{error[i]}</span></div>",
+                    unsafe_allow_html=True,
+                )
+            with fc2:
+                if st.button("Replay", key=f"replay_write_{d['id']}", use_container_width=True):
+                    ok, reason = replay_dead_letter(d["id"])
+                    if not ok:
+                        st.info(reason)
+                    st.rerun()
+            with fc3:
+                if st.button("Discard", key=f"discard_write_{d['id']}", use_container_width=True):
+                    discard_dead_letter(d["id"])
+                    st.rerun()
+
+
+def _render_search_results(df: pd.DataFrame, query: str):
+    """Display one page of search results as a single read-only HTML block."""
+    start, stop = paginate(len(df), 25, "admin_search_page",
+                           (st.session_state.students_version, query))
+    page  = df.iloc[start:stop]
+    flags = page["Flags"].astype(int)
+    valid = flags == ALL_FLAGS
+    color = valid.map({True: "#006633", False: "#cc0000"})
+
+    def mark(req):
+        return ((flags & FLAG_BITS[req]) != 0).map({True: "✅", False: "❌"})
+
+    cards = (
+        "<div style='border-left:4px solid " + color + ";background:#fafafa;"
+        "border-radius:8px;padding:.7rem 1rem;margin-bottom:.5rem'>"
+        "<div style='display:flex;justify-content:space-between;align-items:center'>"
+        "<span style='font-weight:700;font-size:1rem'>" + html_escape(page["Name"]) + "</span>"
+        "<span style='display:flex;gap:.5rem;align-items:center'>"
+        "<span style='background:#e8f5e9;color:#006633;border-radius:12px;"
+        "padding:2px 10px;font-size:.8rem;font-weight:700'>S/N " + page["SN"].astype(str) + "</span>"
+        "<span style='background:" + color + ";color:#fff;border-radius:12px;"
+        "padding:2px 10px;font-size:.75rem;font-weight:600'>"
+        + valid.map({True: "ELIGIBLE", False: "PENDING"}) + "</span></span></div>"
+        "<div style='margin-top:.4rem;font-size:.85rem;color:#555;display:flex;flex-wrap:wrap;gap:.8rem'>"
+        "<span>\U0001F393 " + html_escape(page["Department"]) + "</span>"
+        "<span>\U0001F194 " + html_escape(page["Matric_Number"]) + "</span>"
+        "<span>\U0001F4DD " + html_escape(page["Jamb_Reg"]) + "</span>"
+        "<span>O'Level " + mark("Olevel") + "</span>"
+        "<span>Fees " + mark("School_Fees") + "</span>"
+        "<span>JAMB " + mark("Jamb") + "</span>"
+        "</div></div>"
+    )
+    st.markdown("".join(cards), unsafe_allow_html=True)
 
 
 # ── Edit form (triggered by S/N input) ────────────────────────────────────────
@@ -1308,13 +1570,13 @@ def _render_edit_form():
         eb1, eb2, eb3 = st.columns(3)
         with eb1:
             e_olvl = st.selectbox("O'Level Verified", ["True","False"],
-                                  index=0 if row["Olevel"] is True else 1)
+                                  index=0 if flag(row, "Olevel") else 1)
         with eb2:
             e_fees = st.selectbox("School Fees Paid", ["True","False"],
-                                  index=0 if row["School_Fees"] is True else 1)
+                                  index=0 if flag(row, "School_Fees") else 1)
         with eb3:
             e_jamb = st.selectbox("JAMB Confirmed", ["True","False"],
-                                  index=0 if row["Jamb"] is True else 1)
+                                  index=0 if flag(row, "Jamb") else 1)
 
         save_col, cancel_col = st.columns(2)
         with save_col:
@@ -1330,9 +1592,9 @@ def _render_edit_form():
         errs = []
         if not e_sur.strip(): errs.append("Surname is required.")
         if not e_fst.strip(): errs.append("First name is required.")
-        if not re.match(r"^\d{11}$", e_mat.strip()):
+        if not MATRIC_PATTERN.match(e_mat.strip()):
             errs.append("Matric Number must be exactly 11 digits.")
-        if not re.match(r"^\d{12}[A-Za-z]{2}$", e_jmb.strip()):
+        if not JAMB_PATTERN.match(e_jmb.strip()):
             errs.append("JAMB Reg must be 12 digits + 2 letters.")
         others = full_df[full_df["SN"] != edit_sn]
         if e_mat.strip() in others["Matric_Number"].astype(str).values:
@@ -1345,16 +1607,15 @@ def _render_edit_form():
         else:
             parts = [e_sur.strip(), e_fst.strip()]
             if e_mid.strip(): parts.append(e_mid.strip())
+            full_df = full_df.copy()   # the loaded frame is shared with other sessions
             full_df.loc[row_mask, "Name"]          = " ".join(parts)
             full_df.loc[row_mask, "Matric_Number"] = e_mat.strip()
             full_df.loc[row_mask, "Jamb_Reg"]      = e_jmb.strip().upper()
-            full_df.loc[row_mask, "Department"]    = e_dept
-            full_df.loc[row_mask, "Olevel"]        = e_olvl == "True"
-            full_df.loc[row_mask, "School_Fees"]   = e_fees == "True"
-            full_df.loc[row_mask, "Jamb"]          = e_jamb == "True"
+            set_department(full_df, row_mask, e_dept)
+            full_df.loc[row_mask, "Flags"]         = pack_flags(e_olvl == "True", e_fees == "True",
+                                                                e_jamb == "True")
             st.session_state.csv_df = full_df
             actor = st.session_state.admin_user["username"]
-            persist_students(actor, f"edit SN {edit_sn}")
             try:
                 from github_store import append_log
                 append_log(actor, "EDIT_STUDENT",
@@ -1363,6 +1624,7 @@ def _render_edit_form():
                            f"Dept: {e_dept} | O'Level: {e_olvl} | Fees: {e_fees} | JAMB✓: {e_jamb}")
             except Exception:
                 pass
+            persist_students(actor, f"edit SN {edit_sn}", "edit", [edit_sn])
             st.session_state.edit_sn = None
             st.success(f"\u2705 S/N {edit_sn} — {' '.join(parts)} updated successfully.")
             st.rerun()
@@ -1399,7 +1661,6 @@ def _render_delete_confirm():
             actor = st.session_state.admin_user["username"]
             del_row = full_df[row_mask].iloc[0]
             st.session_state.csv_df = full_df[~row_mask].reset_index(drop=True)
-            persist_students(actor, f"delete SN {del_sn}")
             try:
                 from github_store import append_log
                 append_log(actor, "DELETE_STUDENT",
@@ -1408,6 +1669,7 @@ def _render_delete_confirm():
                            f"Dept: {del_row['Department']}")
             except Exception:
                 pass
+            persist_students(actor, f"delete SN {del_sn}", "delete", [del_sn])
             st.session_state.confirm_del = None
             st.success(f"\U0001F5D1\uFE0F {del_name} (S/N {del_sn}) has been removed.")
             st.rerun()
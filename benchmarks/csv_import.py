@@ -0,0 +1,53 @@
+"""
+Benchmark: time and peak Python memory of roster.read_roster_csv — the
+chunked, validating CSV import — on a synthetic registry export in which
+about a third of the rows break some rule, then the time to turn the
+accepted rows into the records the import commits
+(github_store.df_to_students).
+
+Usage, from the repo root:
+
+    python benchmarks/csv_import.py [rows]      (default 200000)
+"""
+import io, os, sys, time, random, tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from roster import read_roster_csv
+from github_store import df_to_students
+
+DEPARTMENTS = ["Computer Science", "Civil Engineering", "Biochemistry", "Mathematics"]
+BOOL_MAP = {"true": True, "1": True, "yes": True, "false": False, "0": False, "no": False}
+
+
+def _export(n: int) -> bytes:
+    rnd = random.Random(n)
+    lines = ["SN,Name,Matric_Number,Jamb_Reg,Department,Olevel,School_Fees,Jamb"]
+    for i in range(1, n + 1):
+        matric = f"{20250000000 + rnd.randrange(n * 4)}"            # some repeats
+        dept = rnd.choice(DEPARTMENTS + ["Unknown"]) if rnd.random() < .1 else rnd.choice(DEPARTMENTS)
+        flags = [rnd.choice(["true", "false", "1", "0", "yes", "no", "?"] if rnd.random() < .05
+                            else ["true", "false"]) for _ in range(3)]
+        lines.append(f"{i},Student {i} Okafor,{matric},{202500000000 + i}AB,{dept},{','.join(flags)}")
+    return ("\n".join(lines) + "\n").encode()
+
+
+def main(n: int):
+    data = _export(n)
+    t0 = time.perf_counter()
+    valid, rejected = read_roster_csv(io.BytesIO(data), DEPARTMENTS, BOOL_MAP)
+    secs = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    records = df_to_students(valid)
+    commit_secs = time.perf_counter() - t0
+    tracemalloc.start()                 # separate pass: tracing slows it down a lot
+    read_roster_csv(io.BytesIO(data), DEPARTMENTS, BOOL_MAP)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{n} rows ({len(data) / 2 ** 20:.1f} MiB CSV): {len(valid)} valid, {len(rejected)} rejected")
+    print(f"  {secs:.2f} s, peak {peak / 2 ** 20:.1f} MiB allocated, "
+          f"imported roster {valid.memory_usage(deep=True).sum() / 2 ** 20:.1f} MiB")
+    print(f"  commit records: {commit_secs:.2f} s for {len(records)} rows")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
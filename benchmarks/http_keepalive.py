@@ -0,0 +1,79 @@
+"""
+Micro-benchmark: per-request latency of one-shot requests.get() versus the
+pooled keep-alive session storage.GitHubBackend uses for all GitHub traffic.
+
+Runs against a local stand-in HTTPS server (self-signed certificate made
+with the openssl CLI) so the TLS handshake cost is real but the network is
+not. Usage, from the repo root:
+
+    python benchmarks/http_keepalive.py [requests_per_mode]
+"""
+import os, ssl, sys, json, time, tempfile, threading, subprocess, statistics, warnings
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import requests
+from storage import GitHubBackend
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"      # keep-alive, like api.github.com
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = json.dumps({"sha": "0" * 40, "content": ""}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _start_server(tmp: str) -> str:
+    cert, key = os.path.join(tmp, "cert.pem"), os.path.join(tmp, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=localhost", "-keyout", key, "-out", cert],
+        check=True, capture_output=True,
+    )
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    ctx.load_cert_chain(cert, key)
+    srv.socket = ctx.wrap_socket(srv.socket, server_side=True)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return f"https://127.0.0.1:{srv.server_address[1]}/repos/o/r/contents/students.json"
+
+
+def _time(fn, n: int) -> list:
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn().raise_for_status()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+
+def main(n: int = 200):
+    warnings.filterwarnings("ignore")   # self-signed cert, verify=False below
+    with tempfile.TemporaryDirectory() as tmp:
+        url = _start_server(tmp)
+        be  = GitHubBackend("token", "o/r")
+        modes = {
+            "requests.get (new connection)":
+                lambda: requests.get(url, verify=False, timeout=15),
+            "GitHubBackend pooled session":
+                lambda: be.session.get(url, verify=False, timeout=be.timeout),
+        }
+        print(f"{n} GETs per mode against {url.split('/repos')[0]}")
+        for name, fn in modes.items():
+            fn()                            # warm-up (pool: opens the connection)
+            ms = sorted(_time(fn, n))
+            print(f"  {name:32s} mean {statistics.mean(ms):6.2f} ms   "
+                  f"p50 {ms[len(ms) // 2]:6.2f} ms   p95 {ms[int(len(ms) * .95)]:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
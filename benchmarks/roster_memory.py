@@ -0,0 +1,64 @@
+"""
+Benchmark: memory held by one copy of the student roster, in the old
+all-object layout versus the compact model (roster.compact) — Arrow
+strings, categorical Department, and the three status flags packed into a
+uint8 bitmask.
+
+Synthetic records shaped like students.json. Usage, from the repo root:
+
+    python benchmarks/roster_memory.py [rows ...]      (default 10000 100000 1000000)
+"""
+import os, sys, time, random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pandas as pd
+from roster import compact, STRING_DTYPE
+
+_FIELDS = ["Agricultural", "Bioresources", "Civil", "Computer", "Electrical (Power Systems)",
+           "Environmental", "Fisheries", "Material and Metallurgical", "Polymer and Textile",
+           "Telecommunications"]
+DEPARTMENTS = [f"{f} {kind}" for f in _FIELDS
+               for kind in ("Engineering", "Science", "Technology", "Management", "Studies")]
+_NAMES = ["Okafor", "Okonkwo", "Chukwuemeka", "Adeyemi", "Nwosu", "Ibrahim", "Eze", "Obi",
+          "Chidinma", "Ngozi", "Emeka", "Oluwaseun", "Uchenna", "Aisha", "Tobenna"]
+
+
+def _records(n: int) -> list:
+    rnd = random.Random(n)
+    return [{
+        "SN": i + 1,
+        "Name": " ".join(rnd.sample(_NAMES, 3)),
+        "Matric_Number": f"2025{rnd.randrange(10 ** 7):07d}",
+        "Jamb_Reg": f"2025{rnd.randrange(10 ** 8):08d}{rnd.choice('ABCDEFGH')}F",
+        "Department": rnd.choice(DEPARTMENTS),
+        "Olevel": rnd.random() < .8, "School_Fees": rnd.random() < .7, "Jamb": rnd.random() < .9,
+    } for i in range(n)]
+
+
+def _legacy(records: list) -> pd.DataFrame:
+    """The previous layout: every text column object-typed, flags as Python objects."""
+    df = pd.DataFrame(records).astype(object)
+    df["SN"] = df["SN"].astype(int)
+    return df
+
+
+def _mib(df: pd.DataFrame) -> float:
+    return df.memory_usage(deep=True).sum() / 2 ** 20
+
+
+def main(sizes: list):
+    print(f"string dtype: {STRING_DTYPE}")
+    print(f"{'rows':>9}  {'legacy MiB':>10}  {'compact MiB':>11}  {'ratio':>6}  {'compact() s':>11}")
+    for n in sizes:
+        records = _records(n)
+        legacy = _legacy(records)
+        t0 = time.perf_counter()
+        small = compact(legacy)
+        secs = time.perf_counter() - t0
+        print(f"{n:>9}  {_mib(legacy):>10.1f}  {_mib(small):>11.1f}  "
+              f"{_mib(legacy) / _mib(small):>5.1f}x  {secs:>11.2f}")
+        del records, legacy, small
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
@@ -1,56 +1,311 @@
 """
 GitHub-backed store for FUTO PCAP.
-Manages: admins.json, students.json, logs.json, backups/
+Manages: admins.json, students.json (+ students_journal.json), logs/, backups/
 
-KEY DESIGN: All writes to students.json and logs.json are dispatched
+KEY DESIGN: All writes to students.json and logs are dispatched
 to a background thread so the UI never blocks or reruns waiting for
 GitHub. Reads (on page load) are synchronous since we need the data.
+The actual file I/O goes through a storage backend (storage.py) — GitHub
+by default, or a local directory for offline and on-prem runs.
 """
-import json, base64, hashlib, requests, streamlit as st
-import threading
+import os, json, hashlib, requests, streamlit as st
+import threading, atexit, time, random
 from datetime import datetime, timezone
 from collections import deque
-
-GITHUB_API = "https://api.github.com"
+from roster import (JAMB_PATTERN, MATRIC_PATTERN, WIDE_COLUMNS, EligibilityStats,
+                    compact, derived, expanded)
+from search_index import BKTree, FuzzyNameIndex, TrigramIndex
+from storage import (GITHUB_API, GZIP_MIN_BYTES, StorageBackend, GitHubBackend,
+                     LocalBackend, StorageConflict)
 
 # ── Background write queue ─────────────────────────────────────────────────────
 # A single daemon thread drains this queue sequentially, ensuring GitHub
 # writes don't race each other and never block the Streamlit main thread.
+# The thread sleeps on a condition variable until a job arrives or a retry
+# falls due, so an idle process does no polling.
+#
+# Jobs may carry a key (normally the repo path they overwrite). A keyed job
+# that is still waiting when another job with the same key arrives is
+# superseded: it takes the newer callable and keeps both notes, so a burst
+# of student edits collapses into one write of the latest snapshot.
+#
+# A job that fails with a transient error (network, 409 conflict, 429, 5xx,
+# rate limit) is re-queued with jittered exponential backoff. Once it runs
+# out of attempts, or fails with a permanent error, it moves to the
+# dead-letter list, where the admin panel can show and replay it.
+#
+# Every job has a priority class, and the most urgent ready job runs first:
+# student data, then admin data, then audit logs, then preferences. The
+# scheduler also reads the quota the backend last saw (X-RateLimit-* and
+# Retry-After): as the hourly allowance runs down it holds back the lower
+# classes first (RATE_RESERVE), spreads the rest over the window, and stops
+# everything while GitHub has asked us to back off.
+PRIORITY_STUDENTS = 0
+PRIORITY_ADMIN    = 1
+PRIORITY_LOGS     = 2
+PRIORITY_PREFS    = 3
+
+class _WriteJob:
+    __slots__ = ("fn", "key", "notes", "label", "priority", "seq", "attempts",
+                 "not_before", "wal")
+
+    def __init__(self, fn, key=None, notes=None, label=None, priority=PRIORITY_ADMIN,
+                 wal=None):
+        self.fn         = fn
+        self.key        = key
+        self.notes      = notes or []
+        self.label      = label or key or getattr(fn, "__name__", "write")
+        self.priority   = priority
+        self.seq        = 0
+        self.attempts   = 0
+        self.not_before = 0.0
+        self.wal        = wal      # (stream, id): the WAL records this write confirms
+
+    def run(self):
+        # Keyed jobs receive every merged note so they can describe them all
+        return self.fn(self.notes) if self.key is not None else self.fn()
+
+
+WRITE_MAX_ATTEMPTS  = 5
+WRITE_BACKOFF_BASE  = 2.0     # seconds before the first retry
+WRITE_BACKOFF_CAP   = 120.0
+RATE_RESERVE        = (0, 50, 200, 500)   # calls kept back from each priority class
+RATE_PACE_BELOW     = 1000                # start spreading calls out below this
+
 _write_queue: deque = deque()
 _queue_lock  = threading.Lock()
+_queue_cond  = threading.Condition(_queue_lock)
 _worker_started = False
+_job_seq     = 0
+_key_done_seq: dict = {}   # key -> seq of the newest job that succeeded
+_dead_letters: list = []   # [{"id", "label", "error", "attempts", "failed_at", "job"}]
+_retry_policy = (WRITE_MAX_ATTEMPTS, WRITE_BACKOFF_BASE, WRITE_BACKOFF_CAP)
+_last_run    = 0.0     # wall-clock start of the latest job
+_job_secs    = 1.0     # moving average of job run time, for the ETA
 
 def _ensure_worker():
     """Start the background writer thread once per process."""
-    global _worker_started
+    global _worker_started, _retry_policy
     if _worker_started:
         return
     _worker_started = True
+    _retry_policy = (_setting("write_max_attempts", WRITE_MAX_ATTEMPTS),
+                     _setting("write_backoff_base", WRITE_BACKOFF_BASE),
+                     _setting("write_backoff_cap", WRITE_BACKOFF_CAP))
     t = threading.Thread(target=_writer_worker, daemon=True)
     t.start()
 
+def _rate_hold(priority: int) -> float:
+    """Seconds a job of this priority class should wait for the API quota."""
+    if _backend_obj is None:
+        return 0.0
+    remaining, reset, blocked = _backend_obj.rate_limit()
+    now  = time.time()
+    hold = blocked - now if blocked else 0.0
+    if remaining is not None and reset and reset > now:
+        if remaining <= RATE_RESERVE[priority]:
+            hold = max(hold, reset - now)
+        elif remaining < RATE_PACE_BELOW:
+            hold = max(hold, _last_run + (reset - now) / remaining - now)
+    return hold
+
+def _job_delay(job: _WriteJob, now: float) -> float:
+    return max(job.not_before - now, _rate_hold(job.priority), 0.0)
+
+def _next_ready_job():
+    """Block until a job may run, then pop the most urgent. Caller holds _queue_lock."""
+    while True:
+        now  = time.monotonic()
+        best, wait = None, None
+        for job in _write_queue:
+            delay = _job_delay(job, now)
+            if delay <= 0:
+                if best is None or job.priority < best.priority:
+                    best = job
+            elif wait is None or delay < wait:
+                wait = delay
+        if best is not None:
+            _write_queue.remove(best)
+            return best
+        _queue_cond.wait(wait)
+
 def _writer_worker():
-    """Drain _write_queue continuously, executing each write job."""
-    import time
+    """Run queued jobs one at a time, retrying or dead-lettering failures."""
+    global _last_run, _job_secs
     while True:
-        job = None
         with _queue_lock:
-            if _write_queue:
-                job = _write_queue.popleft()
-        if job:
-            try:
-                job()          # each job is a zero-arg callable
-            except Exception:
-                pass           # silently swallow — UI already updated
+            job = _next_ready_job()
+        _last_run = time.time()
+        try:
+            job.run()
+        except Exception as e:
+            _job_failed(job, e)
         else:
-            time.sleep(0.25)  # idle wait
+            with _queue_lock:
+                if job.key is not None:
+                    _key_done_seq[job.key] = max(job.seq, _key_done_seq.get(job.key, 0))
+        _job_secs = 0.8 * _job_secs + 0.2 * (time.time() - _last_run)
+
+
+def _is_transient(e: Exception) -> bool:
+    if isinstance(e, (requests.ConnectionError, requests.Timeout, RuntimeError,
+                      StorageConflict)):
+        return True
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        r = e.response
+        if r.status_code in (409, 429) or r.status_code >= 500:
+            return True
+        if r.status_code == 403 and (r.headers.get("X-RateLimit-Remaining") == "0"
+                                     or "Retry-After" in r.headers):
+            return True
+    return False
 
+def _retry_after(e: Exception) -> float:
+    r = getattr(e, "response", None)
+    try:
+        return float(r.headers.get("Retry-After", 0)) if r is not None else 0.0
+    except ValueError:
+        return 0.0
+
+def _job_failed(job: _WriteJob, e: Exception):
+    max_attempts, base, cap = _retry_policy
+    job.attempts += 1
+    with _queue_lock:
+        newer = next((j for j in _write_queue
+                      if job.key is not None and j.key == job.key), None)
+        if newer is not None:
+            # A newer write for the same file is already waiting — it
+            # supersedes this one, so just hand it our notes.
+            newer.notes[:0] = job.notes
+            return
+        if _is_transient(e) and job.attempts < max_attempts:
+            delay = random.uniform(0, min(cap, base * 2 ** (job.attempts - 1)))
+            job.not_before = time.monotonic() + max(delay, _retry_after(e))
+            _write_queue.append(job)
+            _queue_cond.notify()
+            return
+        _dead_letters.append({
+            "id":        job.seq,
+            "label":     job.label,
+            "notes":     list(job.notes),
+            "error":     f"{type(e).__name__}: {e}",
+            "attempts":  job.attempts,
+            "failed_at": _now(),
+            "job":       job,
+        })
 
-def _enqueue(fn):
-    """Push a write callable onto the background queue."""
+
+def _enqueue(fn, key: str = None, note: str = None, label: str = None,
+             priority: int = PRIORITY_ADMIN, wal: tuple = None):
+    """
+    Push a write callable onto the background queue.
+    With a key, fn is called as fn(notes) and replaces any queued job with
+    the same key instead of queueing behind it. wal is the (stream, id) of
+    the newest WAL record the write covers, retired if it is discarded.
+    """
+    global _job_seq
     _ensure_worker()
     with _queue_lock:
-        _write_queue.append(fn)
+        _job_seq += 1
+        if key is not None:
+            for job in _write_queue:
+                if job.key == key:
+                    job.fn  = fn
+                    job.seq = _job_seq
+                    job.wal = wal or job.wal
+                    if note:
+                        job.notes.append(note)
+                    return
+        job = _WriteJob(fn, key, [note] if note else [], label, priority, wal)
+        job.seq = _job_seq
+        _write_queue.append(job)
+        _queue_cond.notify()
+
+def _cancel_queued(key: str):
+    """Drop any queued job with this key (its write has been made obsolete)."""
+    global _job_seq
+    with _queue_lock:
+        for job in [j for j in _write_queue if j.key == key]:
+            _write_queue.remove(job)
+        _job_seq += 1          # past every existing job, so none of them can be replayed
+        _key_done_seq[key] = _job_seq
+
+
+def sync_status() -> dict:
+    """
+    Counts for the sync indicator: queued, waiting to retry, and failed
+    writes, plus eta — rough seconds until the queue drains (None if empty),
+    from the longest wait on backoff or quota and the average job time.
+    """
+    with _queue_lock:
+        retrying = sum(1 for j in _write_queue if j.attempts)
+        eta = None
+        if _write_queue:
+            now = time.monotonic()
+            eta = (max(_job_delay(j, now) for j in _write_queue)
+                   + len(_write_queue) * _job_secs)
+        return {"pending": len(_write_queue), "retrying": retrying,
+                "failed": len(_dead_letters), "eta": eta}
+
+def dead_letters() -> list:
+    """Writes that gave up, oldest first (without the internal job object)."""
+    with _queue_lock:
+        return [{k: v for k, v in d.items() if k != "job"} for d in _dead_letters]
+
+def replay_dead_letter(letter_id: int):
+    """
+    Re-queue a failed write. Returns (ok, reason). A write to a file that a
+    newer successful (or queued) write has since replaced is discarded
+    instead — replaying it would roll the file back.
+    """
+    with _queue_lock:
+        letter = next((d for d in _dead_letters if d["id"] == letter_id), None)
+        if letter is None:
+            return False, "Failed write not found."
+        _dead_letters.remove(letter)
+        job = letter["job"]
+        if job.key is not None:
+            if _key_done_seq.get(job.key, 0) > job.seq:
+                return False, "A newer write to this file already succeeded."
+            newer = next((j for j in _write_queue if j.key == job.key), None)
+            if newer is not None:
+                newer.notes[:0] = job.notes
+                return True, ""
+        job.attempts, job.not_before = 0, 0.0
+        _write_queue.appendleft(job)
+        _queue_cond.notify()
+    _ensure_worker()
+    return True, ""
+
+def discard_dead_letter(letter_id: int):
+    """
+    Drop a failed write for good. Its WAL records are retired so a restart
+    doesn't replay it, unless a newer write to the same file is queued and
+    will cover them. A journal write takes its still-pending ops with it.
+    """
+    with _queue_lock:
+        letter = next((d for d in _dead_letters if d["id"] == letter_id), None)
+        if letter is None:
+            return
+        _dead_letters.remove(letter)
+        job = letter["job"]
+        queued = job.key is not None and any(j.key == job.key for j in _write_queue)
+    if job.wal is not None and not queued:
+        if job.key == STUDENTS_JOURNAL_PATH:
+            with _journal_lock:
+                _journal_pending.clear()
+                _wal_confirm(STUDENTS_JOURNAL_PATH, _wal_mark(STUDENTS_JOURNAL_PATH))
+        else:
+            _wal_confirm(*job.wal)
+    _release_journal()      # a discarded rewrite no longer holds back journal appends
+
+def _merged_message(prefix: str, notes: list) -> str:
+    """Commit message for a (possibly coalesced) keyed job."""
+    if len(notes) <= 1:
+        return f"{prefix} {notes[0] if notes else 'update'} [{_now()}]"
+    shown = "; ".join(notes[:5])
+    more  = f"; +{len(notes) - 5} more" if len(notes) > 5 else ""
+    return f"{prefix} — {len(notes)} changes: {shown}{more} [{_now()}]"
 
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -58,6 +313,9 @@ def _enqueue(fn):
 # ══════════════════════════════════════════════════════════════════════════════
 
 def secrets_configured() -> bool:
+    """True when the configured backend has what it needs to run."""
+    if _backend_name() == "local":
+        return True
     try:
         gh    = st.secrets["github"]
         token = gh["token"]
@@ -69,16 +327,12 @@ def secrets_configured() -> bool:
     except Exception:
         return False
 
-def _headers():
-    # Read secrets eagerly so the background thread doesn't need Streamlit context
-    token = st.secrets["github"]["token"]
-    return {
-        "Authorization": f"token {token}",
-        "Accept": "application/vnd.github+json",
-    }
-
-def _repo():
-    return st.secrets["github"]["repo"]
+def _setting(name: str, default):
+    """Optional tuning knob from the [store] secrets table, e.g. log_flush_size = 50."""
+    try:
+        return type(default)(st.secrets["store"][name])
+    except Exception:
+        return default
 
 def _now() -> str:
     return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
@@ -88,80 +342,387 @@ def _now_stamp() -> str:
 
 
 # ══════════════════════════════════════════════════════════════════════════════
-# LOW-LEVEL GITHUB FILE I/O  (always synchronous — called by worker or directly)
+# STORAGE BACKEND  (see storage.py)
 # ══════════════════════════════════════════════════════════════════════════════
+# Every read and write goes through one backend object per process. It is
+# built on first use from secrets — in practice on the main thread, since page
+# loads read before anything is written — and captured by queued jobs, so the
+# background writer never needs Streamlit context.
+#
+#   [store]
+#   backend    = "local"        # default "github"
+#   local_root = "pcap_data"    # directory used by the local backend
+#   gzip_min_bytes = 1048576    # gzip documents at least this big; 0 = never
+
+LOCAL_ROOT = "pcap_data"
+HTTP_POOL_CONNECTIONS = 4
+HTTP_POOL_MAXSIZE     = 16
+HTTP_CONNECT_TIMEOUT  = 5.0
+HTTP_READ_TIMEOUT     = 15.0
 
-def _read_file(path: str, headers: dict, repo: str):
-    """Returns (parsed_content, sha) or (None, None) if not found."""
-    url = f"{GITHUB_API}/repos/{repo}/contents/{path}"
-    r = requests.get(url, headers=headers, timeout=15)
-    if r.status_code == 404:
-        return None, None
-    r.raise_for_status()
-    data = r.json()
-    content = json.loads(base64.b64decode(data["content"]).decode())
-    return content, data["sha"]
-
-def _write_file(path: str, payload: dict, commit_msg: str,
-                headers: dict, repo: str, sha: str = None):
-    """Creates or updates a file. sha required for updates."""
-    encoded = base64.b64encode(json.dumps(payload, indent=2).encode()).decode()
-    url  = f"{GITHUB_API}/repos/{repo}/contents/{path}"
-    body = {"message": commit_msg, "content": encoded}
-    if sha:
-        body["sha"] = sha
-    r = requests.put(url, headers=headers, json=body, timeout=15)
-    r.raise_for_status()
+_backend_obj  = None
+_backend_lock = threading.Lock()
+
+def _backend_name() -> str:
+    return _setting("backend", "github").strip().lower()
+
+def _backend() -> StorageBackend:
+    """The process-wide storage backend, created on first use."""
+    global _backend_obj
+    replay = False
+    if _backend_obj is None:
+        with _backend_lock:
+            if _backend_obj is None:
+                if _backend_name() == "local":
+                    _backend_obj = LocalBackend(_setting("local_root", LOCAL_ROOT),
+                                                _setting("gzip_min_bytes", GZIP_MIN_BYTES))
+                else:
+                    gh = st.secrets["github"]
+                    _backend_obj = GitHubBackend(
+                        gh["token"], gh["repo"],
+                        api=_setting("github_api", GITHUB_API),
+                        pool_connections=_setting("http_pool_connections", HTTP_POOL_CONNECTIONS),
+                        pool_maxsize=_setting("http_pool_maxsize", HTTP_POOL_MAXSIZE),
+                        timeout=(_setting("http_connect_timeout", HTTP_CONNECT_TIMEOUT),
+                                 _setting("http_read_timeout", HTTP_READ_TIMEOUT)),
+                        gzip_min_bytes=_setting("gzip_min_bytes", GZIP_MIN_BYTES),
+                    )
+                replay = True
+    if replay:
+        _wal_replay(_backend_obj)
+    return _backend_obj
 
 
 # ══════════════════════════════════════════════════════════════════════════════
-# AUDIT LOGGING  — fire-and-forget background write
+# WRITE-AHEAD LOG  (local, crash-safe record of writes not yet confirmed)
 # ══════════════════════════════════════════════════════════════════════════════
+# The write queue lives in memory, so a restart or crash would lose whatever
+# the UI had already reported as saved. Before a write is accepted, its data
+# is appended to a local JSON-lines file and fsync'd:
+#
+#   {"id": 7, "kind": "journal", "stream": "students_journal", "args": {...}}
+#
+# When the store confirms a write, a {"confirm": stream, "upto": id} line
+# retires every record of that stream up to id — writes on one stream go out
+# in order, so a coalesced job confirms everything it superseded. Once no
+# record is outstanding the file is truncated. On the first backend use after
+# a start, outstanding records are handed back to their kind's handler in
+# _WAL_HANDLERS, which re-buffers and re-queues them. Delivery is
+# at-least-once: a write that landed just before a crash may be repeated.
+#
+#   [store]
+#   wal_path = ".pcap_wal.jsonl"    # "" turns the write-ahead log off
+
+WAL_PATH = ".pcap_wal.jsonl"
 
-LOG_PATH = "logs.json"
+_wal_lock = threading.Lock()
+_wal_file = None
+_wal_seq  = 0
+_wal_live: dict = {}   # id -> stream of records not yet confirmed
+_wal_hi:   dict = {}   # stream -> id of its newest record
+
+def _wal_open():
+    """Open the WAL for appending. Caller holds _wal_lock."""
+    global _wal_file
+    if _wal_file is None:
+        path = _setting("wal_path", WAL_PATH)
+        if path:
+            _wal_file = open(path, "a+", encoding="utf-8")
+    return _wal_file
+
+def _wal_write(f, line: dict):
+    f.write(json.dumps(line, separators=(",", ":")) + "\n")
+    f.flush()
+    os.fsync(f.fileno())
+
+def _wal_record(kind: str, stream: str, args: dict) -> int:
+    """Durably record a write before it is queued. Returns its WAL id."""
+    global _wal_seq
+    with _wal_lock:
+        _wal_seq += 1
+        f = _wal_open()
+        if f is not None:
+            _wal_write(f, {"id": _wal_seq, "kind": kind, "stream": stream, "args": args})
+        _wal_live[_wal_seq] = stream
+        _wal_hi[stream] = _wal_seq
+        return _wal_seq
+
+def _wal_mark(stream: str) -> int:
+    """Id of the newest record on stream — everything a write taken now covers."""
+    with _wal_lock:
+        return _wal_hi.get(stream, 0)
+
+def _wal_confirm(stream: str, upto: int):
+    """Retire stream's records up to id upto once the store has them."""
+    with _wal_lock:
+        done = [i for i, s in _wal_live.items() if s == stream and i <= upto]
+        if not done:
+            return
+        for i in done:
+            del _wal_live[i]
+        f = _wal_open()
+        if f is None:
+            return
+        if _wal_live:
+            _wal_write(f, {"confirm": stream, "upto": upto})
+        else:
+            f.truncate(0)
+            f.flush()
+            os.fsync(f.fileno())
+
+def _wal_replay(be: StorageBackend):
+    """Re-queue every write recorded before the last shutdown but never confirmed."""
+    global _wal_seq, _wal_file
+    with _wal_lock:
+        f = _wal_open()
+        if f is None:
+            return
+        f.seek(0)
+        records = {}
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue               # torn line from a crash mid-write
+            if "confirm" in rec:
+                for i in [i for i, r in records.items()
+                          if r["stream"] == rec["confirm"] and i <= rec["upto"]]:
+                    del records[i]
+            else:
+                records[rec["id"]] = rec
+        # Start over with just the outstanding records, replaced atomically
+        path = f.name
+        f.close()
+        with open(path + ".tmp", "w", encoding="utf-8") as tmp:
+            for i in sorted(records):
+                tmp.write(json.dumps(records[i], separators=(",", ":")) + "\n")
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.replace(path + ".tmp", path)
+        _wal_file = None
+        _wal_seq = max([_wal_seq] + list(records))
+        for i, rec in records.items():
+            _wal_live[i] = rec["stream"]
+            _wal_hi[rec["stream"]] = max(i, _wal_hi.get(rec["stream"], 0))
+    for i in sorted(records):
+        _WAL_HANDLERS[records[i]["kind"]](be, i, records[i]["args"])
+    if records:
+        flush_logs()
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# AUDIT LOGGING  — buffered, flushed to GitHub in batches
+# ══════════════════════════════════════════════════════════════════════════════
+# Entries collect in memory and are written together, so N log lines cost one
+# commit instead of N read-modify-write round trips. A flush happens when the
+# buffer reaches log_flush_size entries, log_flush_interval seconds after the
+# first buffered entry, or at process shutdown.
+#
+# Storage is append-only and sharded by UTC day: logs/<YYYY-MM-DD>.json, rolling
+# over to logs/<YYYY-MM-DD>_2.json etc. after log_shard_max entries. The small
+# logs/manifest.json lists every shard with the timestamp of its first entry,
+# so a flush rewrites only the newest shard and a time-range query reads only
+# the shards that overlap it. The old capped logs.json is kept, untouched, as
+# the first shard.
+
+LOG_PATH          = "logs.json"          # legacy single-file log
+LOG_DIR           = "logs"
+LOG_MANIFEST_PATH = f"{LOG_DIR}/manifest.json"
+LOG_SHARD_MAX     = 1000
+LOG_FLUSH_SIZE     = 25
+LOG_FLUSH_INTERVAL = 30.0
+
+_log_buffer: list = []
+_log_lock  = threading.Lock()
+_log_backend = None  # backend captured by the latest append
+_log_shard_max = LOG_SHARD_MAX
+_log_timer = None
 
 def append_log(actor: str, action: str, detail: str = ""):
-    """Queue a log entry to be written in the background. Never blocks."""
+    """Buffer a log entry for the next batched write. Never blocks."""
+    global _log_backend, _log_shard_max, _log_timer
     entry = {
         "timestamp": _now(),
         "actor":     actor,
         "action":    action,
         "detail":    detail,
     }
-    # Snapshot secrets now (main thread) so background thread doesn't need them
+    # Resolve the backend now (main thread) so background thread doesn't need secrets
     try:
-        hdrs = _headers()
-        repo = _repo()
+        be = _backend()
     except Exception:
         return
 
-    def _do_log():
-        try:
-            content, sha = _read_file(LOG_PATH, hdrs, repo)
-            logs = content.get("logs", []) if content else []
-            logs.append(entry)
-            if len(logs) > 2000:
-                logs = logs[-2000:]
-            _write_file(
-                LOG_PATH,
-                {"logs": logs},
-                f"PCAP log: {actor} — {action}",
-                hdrs, repo, sha,
-            )
-        except Exception:
-            pass
+    with _log_lock:
+        # Recorded under the buffer lock so a batch's WAL mark never covers
+        # an entry that isn't in the batch yet
+        _wal_record("log", LOG_DIR, {"entry": entry})
+        _log_buffer.append(entry)
+        _log_backend = be
+        _log_shard_max = _setting("log_shard_max", LOG_SHARD_MAX)
+        full = len(_log_buffer) >= _setting("log_flush_size", LOG_FLUSH_SIZE)
+        if not full and _log_timer is None:
+            _log_timer = threading.Timer(
+                _setting("log_flush_interval", LOG_FLUSH_INTERVAL), flush_logs)
+            _log_timer.daemon = True
+            _log_timer.start()
+    if full:
+        flush_logs()
+
+def flush_logs(sync: bool = False):
+    """
+    Schedule a write of every buffered entry.
+    The job takes the buffer when it runs rather than when it is queued, so
+    entries always reach GitHub in order even when other jobs (such as a
+    student write that carries its own log entries) drain it first.
+    sync=True writes immediately in the calling thread (used at shutdown,
+    when the background writer may not get another chance to run).
+    """
+    with _log_lock:
+        if not _log_buffer:
+            return
+    if sync:
+        _do_flush_logs()
+    else:
+        _enqueue(_do_flush_logs, key=LOG_DIR, label="audit log",
+                 priority=PRIORITY_LOGS)
+
+def _do_flush_logs(notes=None):
+    batch, be, mark = _take_log_batch()
+    if not batch:
+        return
+    try:
+        be.commit(_log_shard_changes(batch, be), _log_message(batch))
+    except Exception:
+        _restore_log_batch(batch)
+        raise
+    _wal_confirm(LOG_DIR, mark)
+
+atexit.register(flush_logs, True)
+
+
+def _take_log_batch():
+    """Empty the buffer. Returns (entries, backend, WAL mark to confirm once written)."""
+    global _log_timer
+    with _log_lock:
+        if _log_timer is not None:
+            _log_timer.cancel()
+            _log_timer = None
+        batch = list(_log_buffer)
+        _log_buffer.clear()
+        be = _log_backend
+        mark = _wal_mark(LOG_DIR)
+    return batch, be, mark
+
+def _restore_log_batch(batch: list):
+    """Put a batch that failed to write back in front of newer entries."""
+    with _log_lock:
+        _log_buffer[:0] = batch
+
+def _replay_log(be: StorageBackend, wal_id: int, args: dict):
+    global _log_backend
+    with _log_lock:
+        _log_buffer.append(args["entry"])
+        _log_backend = be
+
+def _log_message(batch: list) -> str:
+    first = batch[0]
+    if len(batch) == 1:
+        return f"PCAP log: {first['actor']} — {first['action']}"
+    return (f"PCAP log: {len(batch)} entries "
+            f"[{first['timestamp']} → {batch[-1]['timestamp']}]")
+
+def _load_log_manifest(be: StorageBackend, cached: bool = False):
+    """Returns (shards, sha). Seeds a missing manifest with the legacy logs.json."""
+    content, sha = be.read(LOG_MANIFEST_PATH, cached)
+    if content:
+        return list(content.get("shards", [])), sha
+    legacy, _ = be.read(LOG_PATH, cached)
+    return ([{"path": LOG_PATH, "start": ""}] if legacy else []), None
+
+def _log_shard_changes(batch: list, be: StorageBackend) -> dict:
+    """
+    Works out the file changes that append batch to the newest shard of
+    each day it covers, in the form StorageBackend.commit takes. Shard appends are
+    callables so they are recomputed against fresh content if the commit
+    has to rebase; the manifest only changes when a shard is added, and then
+    merges our new shards into the stored list, so shards another process
+    added meanwhile are kept. Runs on the writer thread, so reads come from
+    what the backend last wrote.
+    """
+    shards, _ = _load_log_manifest(be, cached=True)
+    seed = list(shards)      # stands in for a manifest that doesn't exist yet
+    changes, added = {}, []
+    i = 0
+    while i < len(batch):
+        day    = batch[i]["timestamp"][:10]
+        newest = shards[-1] if shards else None
+        count, exists = 0, False
+        if newest and newest["path"].startswith(f"{LOG_DIR}/{day}"):
+            content, _ = be.read(newest["path"], cached=True)
+            exists = content is not None
+            count  = len(content.get("logs", [])) if content else 0
+        if not exists or count >= _log_shard_max:
+            n    = sum(1 for sh in shards if sh["path"].startswith(f"{LOG_DIR}/{day}"))
+            path = f"{LOG_DIR}/{day}.json" if n == 0 else f"{LOG_DIR}/{day}_{n + 1}.json"
+            newest = {"path": path, "start": batch[i]["timestamp"]}
+            shards.append(newest)
+            added.append(newest)
+            count = 0
+        # Take entries for this day up to the shard's remaining room
+        j = i
+        while (j < len(batch) and batch[j]["timestamp"][:10] == day
+               and count + (j - i) < _log_shard_max):
+            j += 1
+        changes[newest["path"]] = (
+            lambda content, part=batch[i:j]:
+                {"logs": (content.get("logs", []) if content else []) + part}
+        )
+        i = j
+    if added:
+        changes[LOG_MANIFEST_PATH] = lambda content: {"shards": _merged_shards(
+            content.get("shards", []) if content else seed, added)}
+    return changes
+
+def _merged_shards(stored: list, added: list) -> list:
+    """stored plus the added shards it doesn't list yet, in start order."""
+    known = {sh["path"] for sh in stored}
+    return sorted(list(stored) + [sh for sh in added if sh["path"] not in known],
+                  key=lambda sh: (sh["start"], sh["path"]))
 
-    _enqueue(_do_log)
 
+def load_logs(since: str = None, until: str = None) -> list:
+    """
+    Synchronous read — returns log entries newest first, including entries
+    still waiting in the buffer. since/until are timestamps in the same
+    "YYYY-MM-DD HH:MM:SS UTC" form as the entries (inclusive); only the
+    shards overlapping that range are downloaded. Shards before the newest
+    are full or from a past day and never change, so once fetched they are
+    served from the backend's cache; only the manifest and the newest shard
+    are revalidated.
+    """
+    def _in_range(e):
+        ts = e.get("timestamp", "")
+        return (since is None or ts >= since) and (until is None or ts <= until)
 
-def load_logs() -> list:
-    """Synchronous read — returns all log entries newest first."""
+    with _log_lock:
+        pending = [e for e in _log_buffer if _in_range(e)]
     try:
-        content, _ = _read_file(LOG_PATH, _headers(), _repo())
-        logs = content.get("logs", []) if content else []
-        return list(reversed(logs))
+        be = _backend()
+        shards, _ = _load_log_manifest(be)
+        logs = []
+        for i, shard in enumerate(shards):
+            next_start = shards[i + 1]["start"] if i + 1 < len(shards) else None
+            if until is not None and shard["start"] > until:
+                break
+            if since is not None and next_start is not None and next_start < since:
+                continue
+            content, _ = be.read(shard["path"], cached=next_start is not None)
+            logs += [e for e in (content.get("logs", []) if content else [])
+                     if _in_range(e)]
+        return list(reversed(logs + pending))
     except Exception:
-        return []
+        return list(reversed(pending))
 
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -169,135 +730,654 @@ def load_logs() -> list:
 # ══════════════════════════════════════════════════════════════════════════════
 
 ADMINS_PATH = "admins.json"
+ADMIN_CACHE_TTL = 60.0
+
+# ── Process-wide admin directory ──────────────────────────────────────────────
+# Login renders, login attempts and the Manage Admins tab all read from one
+# cached copy of admins.json, indexed by lowercased username, instead of
+# downloading it each time. It is refreshed after admin_cache_ttl seconds
+# (picking up changes made by other server processes) and replaced with the
+# written content after every admin write made here.
+_admin_lock  = threading.Lock()
+_admin_dir   = None    # (loaded_at, [admin dicts], {username.lower(): dict})
+
+def _set_admin_directory(admins: list):
+    global _admin_dir
+    with _admin_lock:
+        _admin_dir = (time.monotonic(), admins,
+                      {a["username"].lower(): a for a in admins})
+
+def _admin_directory():
+    """Returns (admins, by_username) — shared and read-only."""
+    with _admin_lock:
+        cached = _admin_dir
+    if cached and time.monotonic() - cached[0] < _setting("admin_cache_ttl", ADMIN_CACHE_TTL):
+        return cached[1], cached[2]
+    content, _ = _backend().read(ADMINS_PATH)
+    _set_admin_directory(list(content.get("admins", [])) if content else [])
+    return _admin_dir[1], _admin_dir[2]
 
 def load_admins() -> list:
-    content, _ = _read_file(ADMINS_PATH, _headers(), _repo())
-    return content.get("admins", []) if content else []
-
-def _save_admins_sync(admins_list: list):
-    hdrs = _headers(); repo = _repo()
-    content, sha = _read_file(ADMINS_PATH, hdrs, repo)
-    _write_file(
-        ADMINS_PATH,
-        {"admins": admins_list},
-        f"PCAP admin update [{_now()}]",
-        hdrs, repo, sha,
-    )
+    """Returns a fresh list of admin dicts — callers may modify it freely."""
+    return [dict(a) for a in _admin_directory()[0]]
+
+def _find_admin(username: str):
+    """The cached admin record for username (any case), or None."""
+    return _admin_directory()[1].get(username.lower())
+
+def _update_admins(mutate, commit_msg: str = None):
+    """
+    Applies mutate(admins) to admins.json and writes it back. The backend
+    writes against the sha it already knows and only re-reads (re-applying
+    mutate) if another writer got there first. The directory cache then
+    holds exactly what was written.
+    """
+    global _admin_dir
+    written = None
+
+    def _payload(content):
+        nonlocal written
+        admins = [dict(a) for a in content.get("admins", [])] if content else []
+        mutate(admins)
+        written = admins
+        return {"admins": admins}
+    try:
+        _backend().write(ADMINS_PATH, _payload,
+                         commit_msg or f"PCAP admin update [{_now()}]")
+    except Exception:
+        with _admin_lock:
+            _admin_dir = None      # outcome unknown — reload on next use
+        raise
+    _set_admin_directory(written)
 
 def hash_password(password: str) -> str:
     return hashlib.sha256(password.encode()).hexdigest()
 
 def verify_admin(username: str, password: str):
-    admins = load_admins()
-    h = hash_password(password)
-    for a in admins:
-        if a["username"].lower() == username.lower() and a["password_hash"] == h:
-            return a
+    a = _find_admin(username)
+    if a is not None and a["password_hash"] == hash_password(password):
+        return dict(a)
     return None
 
+class _UsernameTaken(ValueError):
+    """Raised from a mutate callback when the stored admins already use the name."""
+
+def _check_username_free(admins: list, username: str, allowed: str = None):
+    """
+    Raises _UsernameTaken if an admin other than `allowed` has username.
+    Called inside mutate callbacks too: the directory cache may be
+    admin_cache_ttl old, but the callback sees what the write is based on.
+    """
+    for a in admins:
+        name = a["username"].lower()
+        if name == username.lower() and (allowed is None or name != allowed.lower()):
+            raise _UsernameTaken(username)
+
 def create_admin(username: str, password: str, phone: str, created_by: str):
-    admins = load_admins()
-    if any(a["username"].lower() == username.lower() for a in admins):
-        return False, "Username already exists."
-    admins.append({
+    record = {
         "username":      username,
         "password_hash": hash_password(password),
         "phone":         phone,
         "created_by":    created_by,
         "created_at":    _now(),
-    })
-    _save_admins_sync(admins)
+    }
+
+    def _apply(admins):
+        _check_username_free(admins, username)
+        admins.append(record)
+    try:
+        _check_username_free(_admin_directory()[0], username)
+        _update_admins(_apply)
+    except _UsernameTaken:
+        return False, "Username already exists."
     append_log(created_by, "CREATE_ADMIN",
                f"Created admin: {username} | Phone: {phone}")
     return True, ""
 
 def update_admin_credentials(username: str, new_username: str,
                               new_password: str, new_phone: str):
-    admins = load_admins()
-    for a in admins:
-        if (a["username"].lower() == new_username.lower()
-                and a["username"].lower() != username.lower()):
-            return False, "New username is already taken."
-    for i, a in enumerate(admins):
-        if a["username"].lower() == username.lower():
-            admins[i]["username"]      = new_username
-            admins[i]["password_hash"] = hash_password(new_password)
-            admins[i]["phone"]         = new_phone
-            _save_admins_sync(admins)
-            append_log(username, "UPDATE_OWN_CREDENTIALS",
-                       f"Username → '{new_username}', phone → '{new_phone}'")
-            return True, ""
-    return False, "Admin not found."
+    if _find_admin(username) is None:
+        return False, "Admin not found."
+
+    def _apply(admins):
+        _check_username_free(admins, new_username, allowed=username)
+        for a in admins:
+            if a["username"].lower() == username.lower():
+                a["username"]      = new_username
+                a["password_hash"] = hash_password(new_password)
+                a["phone"]         = new_phone
+                break
+    try:
+        _check_username_free(_admin_directory()[0], new_username, allowed=username)
+        _update_admins(_apply)
+    except _UsernameTaken:
+        return False, "New username is already taken."
+    append_log(username, "UPDATE_OWN_CREDENTIALS",
+               f"Username → '{new_username}', phone → '{new_phone}'")
+    return True, ""
 
 def save_admin_theme(username: str, theme: str):
     """Persist an admin preferred theme. Background write."""
     try:
-        hdrs = _headers(); repo = _repo()
+        _backend()
     except Exception:
         return
+    stream = f"theme:{username.lower()}"
+    _queue_theme(username, theme,
+                 _wal_record("theme", stream, {"username": username, "theme": theme}))
 
-    def _do():
-        try:
-            content, sha = _read_file(ADMINS_PATH, hdrs, repo)
-            admins = content.get("admins", []) if content else []
-            for i, a in enumerate(admins):
-                if a["username"].lower() == username.lower():
-                    admins[i]["theme"] = theme
-                    break
-            _write_file(ADMINS_PATH, {"admins": admins},
-                        f"PCAP theme pref: {username} to {theme}", hdrs, repo, sha)
-        except Exception:
-            pass
+def _queue_theme(username: str, theme: str, wal_id: int):
+    stream = f"theme:{username.lower()}"
+
+    def _apply(admins):
+        for a in admins:
+            if a["username"].lower() == username.lower():
+                a["theme"] = theme
+                break
+
+    def _do(notes):
+        _update_admins(_apply, f"PCAP theme pref: {username} to {theme}")
+        _wal_confirm(stream, wal_id)
+
+    # Only the last toggle matters when several are still waiting
+    _enqueue(_do, key=stream, note=theme, label=f"theme preference for {username}",
+             priority=PRIORITY_PREFS, wal=(stream, wal_id))
 
-    _enqueue(_do)
+def _replay_theme(be: StorageBackend, wal_id: int, args: dict):
+    _queue_theme(args["username"], args["theme"], wal_id)
 
 def bootstrap_needed() -> bool:
-    return len(load_admins()) == 0
+    return not _admin_directory()[0]
 
 
 # ══════════════════════════════════════════════════════════════════════════════
-# STUDENT STORE  (students.json — background writes)
+# STUDENT STORE  (students.json + students_journal.json — background writes)
 # ══════════════════════════════════════════════════════════════════════════════
+# students.json is a base snapshot; students_journal.json is an append-only
+# list of per-record operations made since, each numbered with a journal seq:
+#
+#   {"op": "add" | "edit" | "delete", "SN": 12, "record": {...}, "seq": 41}
+#
+# An add or edit costs a small journal append instead of re-uploading every
+# student. The base records the last seq folded into it ("journal_seq"), and
+# loading replays only the journal ops after that. Once the journal holds
+# journal_compact_ops entries a background compaction folds it into a new
+# base. A base write and the journal prune are committed together, and even
+# apart they stay consistent: replay skips ops the base already covers.
 
-STUDENTS_PATH = "students.json"
+STUDENTS_PATH         = "students.json"
+STUDENTS_JOURNAL_PATH = "students_journal.json"
+JOURNAL_COMPACT_OPS   = 200
+
+_journal_pending: list = []    # ops not yet handed to the writer
+_journal_lock  = threading.Lock()
+_journal_epoch = 0             # bumped by full rewrites; stale ops are dropped
+_students_gen  = 0             # bumped by clear-all/restore; older snapshots are void
+
+# Writer jobs that commit student files, and clear-all/restore on the UI
+# thread, hold this around read-and-commit, so a job already running when
+# the data is replaced finishes first instead of landing after the wipe.
+_students_commit_lock = threading.Lock()
+
+def _replay_journal(students: list, ops: list, after: int = 0) -> list:
+    """Apply journal ops with seq > after to a list of student dicts."""
+    by_sn = {int(s["SN"]): s for s in students}
+    for op in ops:
+        if op.get("seq", 0) <= after:
+            continue
+        sn = int(op["SN"])
+        if op["op"] == "delete":
+            by_sn.pop(sn, None)
+        else:
+            by_sn[sn] = op["record"]
+    return list(by_sn.values())
+
+def _read_student_files(be: StorageBackend, cached: bool = False):
+    """Returns (base students, base journal_seq, journal content)."""
+    base, _    = be.read(STUDENTS_PATH, cached)
+    journal, _ = be.read(STUDENTS_JOURNAL_PATH, cached)
+    base = base or {}
+    return base.get("students", []), base.get("journal_seq", 0), journal or {}
+
+def _fetch_students_state(be: StorageBackend):
+    """Returns (students, (base sha, journal sha)) from plain, revalidated reads."""
+    base, base_sha       = be.read(STUDENTS_PATH)
+    journal, journal_sha = be.read(STUDENTS_JOURNAL_PATH)
+    base, journal = base or {}, journal or {}
+    students = _replay_journal(base.get("students", []), journal.get("ops", []),
+                               base.get("journal_seq", 0))
+    return students, (base_sha, journal_sha)
+
+def _fetch_students() -> list:
+    return _fetch_students_state(_backend())[0]
 
 def load_students() -> list:
     """Synchronous read on startup."""
     try:
-        content, _ = _read_file(STUDENTS_PATH, _headers(), _repo())
-        return content.get("students", []) if content else []
+        return _fetch_students()
     except Exception:
         return []
 
+def _base_changes(students: list, seq: int) -> dict:
+    """Changes that make students the base as of journal seq and prune the journal."""
+    return {
+        STUDENTS_PATH: {"students": students, "journal_seq": seq},
+        STUDENTS_JOURNAL_PATH: lambda content: {
+            "seq": max(seq, (content or {}).get("seq", 0)),
+            "ops": [op for op in (content or {}).get("ops", []) if op["seq"] > seq],
+        },
+    }
+
+def _drop_pending_journal() -> int:
+    """
+    Forget journal ops that a full rewrite has made obsolete. Returns the
+    WAL mark to confirm them at once the rewrite is safe.
+    """
+    global _journal_epoch
+    _cancel_queued(STUDENTS_JOURNAL_PATH)
+    with _journal_lock:
+        _journal_pending.clear()
+        _journal_epoch += 1
+        return _wal_mark(STUDENTS_JOURNAL_PATH)
+
+def _with_log_batch(be: StorageBackend, changes: dict, msg: str):
+    """
+    Commit changes together with any buffered audit entries — the entries
+    for these edits are usually already waiting, and landing both in one
+    commit keeps records and log in step.
+    """
+    batch, _, mark = _take_log_batch()
+    try:
+        if batch:
+            changes.update(_log_shard_changes(batch, be))
+            msg += f" (+{len(batch)} log entries)"
+        result = be.commit(changes, msg)
+    except Exception:
+        _restore_log_batch(batch)
+        raise
+    _wal_confirm(LOG_DIR, mark)
+    return result
+
+def journal_students(op: str, records: list, actor: str = "system",
+                     action_note: str = "update"):
+    """
+    Background write of per-record changes — op is "add", "edit" or
+    "delete", records the affected student dicts (a delete only needs SN).
+    Ops queue up and a burst of edits goes out as one journal append.
+    """
+    try:
+        be = _backend()
+    except Exception:
+        return
+    ops = [{"op": op, "SN": int(r["SN"]), "record": dict(r)} for r in records]
+    with _journal_lock:
+        _wal_record("journal", STUDENTS_JOURNAL_PATH, {"ops": ops})
+        _journal_pending.extend(ops)
+    _queue_journal_append(be, f"{action_note} by {actor}")
+
+def _queue_journal_append(be: StorageBackend, note: str = None):
+    _enqueue(lambda notes: _append_journal(be, notes), key=STUDENTS_JOURNAL_PATH,
+             note=note, label="student records", priority=PRIORITY_STUDENTS,
+             wal=(STUDENTS_JOURNAL_PATH, _wal_mark(STUDENTS_JOURNAL_PATH)))
+
+def _snapshot_outstanding() -> bool:
+    """True while a full rewrite is queued, retrying, or failed but replayable."""
+    with _queue_lock:
+        done = _key_done_seq.get(STUDENTS_PATH, 0)
+        return (any(j.key == STUDENTS_PATH for j in _write_queue)
+                or any(d["job"].key == STUDENTS_PATH and d["job"].seq >= done
+                       for d in _dead_letters))
+
+def _release_journal():
+    """Queue an append for ops held back while a full rewrite was outstanding."""
+    with _journal_lock:
+        held = bool(_journal_pending)
+    if held and _backend_obj is not None:
+        _queue_journal_append(_backend_obj)
+
+def _append_journal(be: StorageBackend, notes: list):
+    """Writer job: append every pending op to the journal in one commit."""
+    with _students_commit_lock:
+        _do_append_journal(be, notes)
+
+def _do_append_journal(be: StorageBackend, notes: list):
+    # Ops made after a full rewrite was accepted stay pending until it lands:
+    # the rewrite stamps the base with the journal seq it finds when it runs,
+    # so an op appended ahead of it would be counted as covered and pruned.
+    if _snapshot_outstanding():
+        return
+    with _journal_lock:
+        ops, epoch = list(_journal_pending), _journal_epoch
+        mark = _wal_mark(STUDENTS_JOURNAL_PATH)
+        _journal_pending.clear()
+    if not ops:
+        return
+    size = 0
+
+    def _append(content):
+        nonlocal size
+        content = content or {}
+        seq = content.get("seq", 0)
+        new = [{**o, "seq": seq + i} for i, o in enumerate(ops, 1)]
+        size = len(content.get("ops", [])) + len(new)
+        return {"seq": seq + len(new), "ops": content.get("ops", []) + new}
+
+    try:
+        _with_log_batch(be, {STUDENTS_JOURNAL_PATH: _append},
+                        _merged_message("PCAP students", notes))
+    except Exception:
+        with _journal_lock:
+            if epoch == _journal_epoch:
+                _journal_pending[:0] = ops
+        raise
+    _wal_confirm(STUDENTS_JOURNAL_PATH, mark)
+    if size >= _setting("journal_compact_ops", JOURNAL_COMPACT_OPS):
+        _enqueue(lambda notes: _compact_journal(be), key="students:compact",
+                 label="student journal compaction", priority=PRIORITY_STUDENTS)
+
+def _replay_journal_ops(be: StorageBackend, wal_id: int, args: dict):
+    with _journal_lock:
+        _journal_pending.extend(args["ops"])
+    _queue_journal_append(be, "replayed after restart")
+
+def _compact_journal(be: StorageBackend):
+    """Fold the journal into a new base snapshot (runs on the writer thread)."""
+    with _students_commit_lock:
+        students, seq, journal = _read_student_files(be, cached=True)
+        ops  = journal.get("ops", [])
+        last = max([seq] + [op["seq"] for op in ops])
+        if last == seq:
+            return
+        be.commit(_base_changes(_replay_journal(students, ops, seq), last),
+                  f"PCAP students compacted through journal seq {last} [{_now()}]")
+
 def save_students(students_list: list, actor: str = "system", action_note: str = "update"):
     """
-    Background write — returns immediately, GitHub update happens async.
-    The UI already has the correct state in session_state; this just persists it.
+    Background rewrite of the whole dataset (CSV import) — returns
+    immediately. Per-record edits should go through journal_students.
     """
     try:
-        hdrs = _headers()
-        repo = _repo()
+        be = _backend()
     except Exception:
         return
 
-    # Snapshot the list so it can't mutate between enqueue and execution
+    # Snapshot the list so it can't mutate between enqueue and execution.
+    # It already contains every journalled change still waiting to go out,
+    # so once the snapshot is in the WAL those ops are no longer needed.
+    # Edits made after this wait in _journal_pending until it has landed.
     snapshot = list(students_list)
+    note = f"{action_note} by {actor}"
+    wal_id = _wal_record("students", STUDENTS_PATH, {"students": snapshot, "note": note})
+    _wal_confirm(STUDENTS_JOURNAL_PATH, _drop_pending_journal())
+    _queue_students_write(be, snapshot, note, wal_id)
+
+def _queue_students_write(be: StorageBackend, snapshot: list, note: str, wal_id: int):
+    gen = _students_gen
+
+    def _do_write(notes):
+        with _students_commit_lock:
+            if gen == _students_gen:       # else a clear-all/restore replaced it
+                _, _, journal = _read_student_files(be, cached=True)
+                _with_log_batch(be, _base_changes(snapshot, journal.get("seq", 0)),
+                                _merged_message("PCAP students", notes))
+            _wal_confirm(STUDENTS_PATH, wal_id)
+        _release_journal()
 
-    def _do_write():
+    # A newer snapshot supersedes any that is still waiting in the queue
+    _enqueue(_do_write, key=STUDENTS_PATH, note=note, label="student records",
+             priority=PRIORITY_STUDENTS, wal=(STUDENTS_PATH, wal_id))
+
+def _replay_students(be: StorageBackend, wal_id: int, args: dict):
+    _queue_students_write(be, args["students"], args["note"], wal_id)
+
+# ── Process-wide shared dataset ───────────────────────────────────────────────
+# Streamlit re-runs app.py for every session, but this module is imported once
+# per server process. The first session to ask downloads students.json; every
+# other session reuses the same DataFrame. Admin writes never mutate it — they
+# publish a new version, so readers always hold a consistent snapshot.
+#
+# Other server processes (replicas) write to the same files, so after
+# students_cache_ttl seconds the next session revalidates both files with
+# conditional reads — unchanged files cost a 304, which GitHub doesn't count
+# against the rate limit. If either sha moved and the roster differs from
+# ours, the reloaded roster is published as a new version. The check is
+# skipped while a student write of ours is still pending or landing, since
+# the stored files don't hold it yet.
+STUDENTS_CACHE_TTL = 30.0
+
+_shared_lock    = threading.Lock()
+_shared_df      = None
+_shared_version = 0    # 0 = not loaded yet
+_shared_shas    = None # (base sha, journal sha) the shared dataset was checked against
+_shared_checked = 0.0  # monotonic time of the last load or revalidation
+
+def shared_students():
+    """
+    Returns (version, df) for the process-wide dataset, loading it on first use
+    and revalidating it once students_cache_ttl has passed.
+    The DataFrame is shared by every session — treat it as read-only.
+    A failed first load raises and leaves the dataset unloaded so the next
+    session retries instead of everyone seeing an empty roster.
+    """
+    global _shared_df, _shared_version, _shared_shas, _shared_checked
+    with _shared_lock:
+        now = time.monotonic()
+        if _shared_version == 0:
+            students, _shared_shas = _fetch_students_state(_backend())
+            _shared_df = students_to_df(students)
+            _shared_version, _shared_checked = 1, now
+            return _shared_version, _shared_df
+        stale = now - _shared_checked >= _setting("students_cache_ttl", STUDENTS_CACHE_TTL)
+        if stale:
+            _shared_checked = now          # one session revalidates, the rest carry on
+    if stale:
+        _revalidate_students()
+    with _shared_lock:
+        return _shared_version, _shared_df
+
+def _revalidate_students():
+    """Publish the stored roster if another process has changed it."""
+    global _shared_shas
+    if not _students_commit_lock.acquire(blocking=False):
+        return                             # one of our writes is landing; next time
+    try:
+        with _journal_lock:
+            pending = bool(_journal_pending)
+        if pending or _snapshot_outstanding():
+            return
+        with _shared_lock:
+            version, known = _shared_version, _shared_shas
         try:
-            content, sha = _read_file(STUDENTS_PATH, hdrs, repo)
-            _write_file(
-                STUDENTS_PATH,
-                {"students": snapshot},
-                f"PCAP students {action_note} by {actor} [{_now()}]",
-                hdrs, repo, sha,
-            )
+            students, shas = _fetch_students_state(_backend())
         except Exception:
-            pass
+            return
+        if shas == known:
+            return
+        df = students_to_df(students)
+        with _shared_lock:
+            if _shared_version != version:     # a local publish won the race
+                return
+            _shared_shas = shas
+            if _same_roster(df, _shared_df):   # e.g. our own writes landing
+                return
+        publish_students(df)
+    finally:
+        _students_commit_lock.release()
+
+def _same_roster(a, b) -> bool:
+    """Whether two roster frames hold the same records, in any row order."""
+    if a is None or b is None:
+        return a is b
+    if len(a) != len(b):
+        return False
+    a, b = (expanded(x).astype({"SN": "int64"}).sort_values("SN", ignore_index=True)
+            for x in (a, b))
+    return a.equals(b)
+
+def publish_students(df, changed_sns=None) -> int:
+    """
+    Atomically swap in a new dataset version after an admin write. Returns it.
+    changed_sns lists the SNs an add/edit/delete touched, so derived indexes
+    can be updated instead of rebuilt; None means anything may have changed.
+    """
+    global _shared_df, _shared_version, _stats
+    with _shared_lock:
+        have, stats = _stats
+        if changed_sns is not None and have == _shared_version:
+            _stats = (_shared_version + 1, stats.updated(_shared_df, df, changed_sns))
+        _shared_df = df
+        _shared_version += 1
+        with _search_lock:
+            _search_deltas[_shared_version] = (
+                None if changed_sns is None else [int(sn) for sn in changed_sns])
+            for v in [v for v in _search_deltas if v < _shared_version - 50]:
+                del _search_deltas[v]
+        return _shared_version
 
-    _enqueue(_do_write)
+# ── Eligibility statistics ────────────────────────────────────────────────────
+# Counts by department and missing requirement (roster.EligibilityStats) for
+# the stats bar and the dashboard. Built once for a freshly loaded or
+# imported roster, then carried through add/edit/delete publishes by moving
+# only the touched SNs between counts.
+_stats = (None, None)   # (version, EligibilityStats); guarded by _shared_lock
+
+def eligibility_stats(version: int, df):
+    """
+    EligibilityStats for dataset version `version` (df). Only the published
+    frame of the current version is cached; any other frame (a session's
+    private copy, an import preview) is counted uncached.
+    """
+    global _stats
+    with _shared_lock:
+        have, stats = _stats
+        current = version == _shared_version and df is _shared_df
+    if current and have == version:
+        return stats
+    stats = EligibilityStats.build(df)
+    if current:
+        with _shared_lock:
+            if version == _shared_version and df is _shared_df:
+                _stats = (version, stats)
+    return stats
+
+# ── Exact-key index ───────────────────────────────────────────────────────────
+# Most students search with their own Matric Number or JAMB Reg. A term in
+# exactly one of those formats (the add form's rules) is answered from a
+# dict over the normalised column values — stripped and lowercased — built
+# once per dataset version and shared by every session. It maps keys to
+# SNs and is kept only for the published frame, so a session holding a
+# private copy never gets rows of another frame.
+
+_key_index_lock = threading.Lock()
+_key_index      = (None, None, None)    # (version, df, {column: {key: [SN, ...]}})
+
+def _exact_key_index(version: int, df) -> dict:
+    global _key_index
+    with _key_index_lock:
+        have, cached_df, index = _key_index
+    if have == version and cached_df is df:
+        return index
+    sns = df["SN"].tolist()
+    index = {}
+    for col in ("Matric_Number", "Jamb_Reg"):
+        keys = index[col] = {}
+        for sn, key in zip(sns, df[col].astype(str).str.strip().str.lower().tolist()):
+            keys.setdefault(key, []).append(sn)
+    if df is _shared_df:                   # a private copy is answered uncached
+        with _key_index_lock:
+            _key_index = (version, df, index)
+    return index
+
+# ── Substring search ──────────────────────────────────────────────────────────
+# Name (student view) and admin searches are answered from a trigram index
+# (search_index.py) over the searched columns, keyed by SN. It is built for
+# the current dataset version, a column at a time as searches need them, and
+# carried forward through add/edit/delete publishes by updating only the
+# touched SNs. Terms it can't answer with str.contains semantics (under 3
+# characters, regex characters) — or an older version than the one indexed —
+# fall back to a scan of the lowercased columns memoised in roster.py.
+SEARCH_COLUMNS = ("SN", "Name", "Matric_Number", "Jamb_Reg", "Department")
+
+_search_lock   = threading.Lock()
+_search_index  = (None, None)   # (version, TrigramIndex or None)
+_search_deltas: dict = {}       # version -> SNs changed by it, or None (full change)
+
+def _trigram_index(version: int, df, columns: tuple):
+    """The index for this dataset version covering columns, updated or built as needed."""
+    global _search_index
+    with _search_lock:
+        have, index = _search_index
+        if have is not None and have > version:
+            return None                # a session still on an older version
+        steps = ([_search_deltas.get(v) for v in range(have + 1, version + 1)]
+                 if have is not None and index is not None else [None])
+    if have != version:
+        changed = None if any(s is None for s in steps) else {sn for s in steps for sn in s}
+        index = (TrigramIndex.build(df, columns) if changed is None
+                 else index.updated(df, changed))
+    if index is not None and not set(columns) <= set(index.columns):
+        index = index.extended(df, columns)
+    with _search_lock:
+        if _search_index[0] is None or _search_index[0] <= version:
+            _search_index = (version, index)
+    return index
+
+def search_students(version: int, df, term: str, columns: tuple = SEARCH_COLUMNS):
+    """Rows of df where any of columns contains term, case-insensitively."""
+    import pandas as pd
+    term = term.strip().lower()
+    index = (_trigram_index(version, df, columns)
+             if TrigramIndex.answers(term) and not df.empty else None)
+    if index is not None:
+        return df[df["SN"].isin(index.search(term, columns))]
+    mask = pd.Series(False, index=df.index)
+    for col in columns:
+        if col in df.columns:
+            mask |= derived(version, df, f"lower:{col}").str.contains(term, na=False)
+    return df[mask]
+
+def find_by_key(version: int, df, term: str):
+    """
+    Rows of df (dataset version `version`) whose Matric_Number or Jamb_Reg
+    is exactly term, or None when term is in neither format and the caller
+    should fall back to a name search.
+    """
+    term = term.strip()
+    col = ("Matric_Number" if MATRIC_PATTERN.match(term)
+           else "Jamb_Reg" if JAMB_PATTERN.match(term) else None)
+    if col is None:
+        return None
+    sns = _exact_key_index(version, df)[col].get(term.lower(), [])
+    return df[df["SN"].isin(sns)]
+
+# ── Typo-tolerant name search ─────────────────────────────────────────────────
+# Students misspell their own names (Okonkow for Okonkwo). The name words of
+# every roster ever published go into one process-wide BK-tree; the map from
+# word to SNs is rebuilt once per dataset version, on first fuzzy query.
+FUZZY_TOP_K = 5
+
+_fuzzy_lock  = threading.Lock()
+_fuzzy_words = BKTree()
+_fuzzy_index = (None, None)     # (version, FuzzyNameIndex)
+
+def fuzzy_search_students(version: int, df, term: str, k: int = FUZZY_TOP_K):
+    """Up to k rows of df whose names are closest to term, best match first."""
+    global _fuzzy_index
+    if df.empty:
+        return df
+    with _fuzzy_lock:
+        have, index = _fuzzy_index
+    if have != version:
+        index = FuzzyNameIndex(df, _fuzzy_words)
+        with _fuzzy_lock:
+            if _fuzzy_index[0] is None or _fuzzy_index[0] <= version:
+                _fuzzy_index = (version, index)
+    rank = {sn: i for i, sn in enumerate(index.search(term, k))}
+    rows = df[df["SN"].isin(rank)]
+    return rows.iloc[rows["SN"].map(rank).argsort(kind="stable")]
 
 def students_to_df(students_list: list):
+    """Records -> the compact roster frame (roster.py), or None if empty."""
     import pandas as pd
     if not students_list:
         return None
@@ -307,77 +1387,242 @@ def students_to_df(students_list: list):
             df[c] = df[c].map(
                 lambda x: x is True or str(x).lower() in ("true", "1", "yes")
             )
-    return df
+    return compact(df)
 
 def df_to_students(df) -> list:
-    records = []
-    for _, row in df.iterrows():
-        records.append({
-            "SN":            int(row["SN"]),
-            "Name":          str(row["Name"]),
-            "Matric_Number": str(row["Matric_Number"]),
-            "Jamb_Reg":      str(row["Jamb_Reg"]),
-            "Department":    str(row["Department"]),
-            "Olevel":        row["Olevel"] is True,
-            "School_Fees":   row["School_Fees"] is True,
-            "Jamb":          row["Jamb"] is True,
-        })
-    return records
+    """The compact roster frame -> JSON-ready records (built column-wise)."""
+    wide = expanded(df)[WIDE_COLUMNS].astype({"SN": int})
+    return wide.to_dict("records")
 
 
 # ══════════════════════════════════════════════════════════════════════════════
 # BACKUP  (backups/students_backup_TIMESTAMP.json — background write)
 # ══════════════════════════════════════════════════════════════════════════════
+# Backups are incremental and content-addressed. The records are cut into
+# chunks at content-defined boundaries (after a record whose hash hits
+# 1 in backup_chunk_avg, within min/max sizes), so an edit, insert or delete
+# only changes the chunk around it. Each chunk is stored once, at
+# backups/chunks/<sha256>.json, and backups/chunks/index.json lists the
+# chunks already stored. A backup file is then just its metadata plus the
+# ordered chunk ids; uploading it costs the chunks that changed since any
+# earlier backup. Older backups holding a full "students" list still load.
+#
+# backups/catalogue.json keeps each backup's metadata (file, time, actor,
+# count) so the admin panel can list backups without opening any of them.
 
-def backup_students(students_list: list, actor: str) -> str:
-    """Queues a background backup write. Returns the filename immediately."""
-    stamp    = _now_stamp()
-    filename = f"backups/students_backup_{stamp}.json"
-    payload  = {
+BACKUP_DIR         = "backups"
+BACKUP_CHUNK_DIR   = f"{BACKUP_DIR}/chunks"
+BACKUP_CHUNK_INDEX = f"{BACKUP_CHUNK_DIR}/index.json"
+BACKUP_CATALOGUE   = f"{BACKUP_DIR}/catalogue.json"
+BACKUP_CHUNK_AVG   = 256     # records per chunk, on average
+BACKUP_CHUNK_MIN   = 32
+BACKUP_CHUNK_MAX   = 2048
+
+def _digest(obj) -> str:
+    data = json.dumps(obj, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.sha256(data).hexdigest()
+
+def _chunk_records(students: list) -> list:
+    """Split records into content-defined chunks (lists of records)."""
+    avg = _setting("backup_chunk_avg", BACKUP_CHUNK_AVG)
+    chunks, current = [], []
+    for rec in students:
+        current.append(rec)
+        cut = int(_digest(rec)[:8], 16) % avg == 0
+        if (cut and len(current) >= BACKUP_CHUNK_MIN) or len(current) >= BACKUP_CHUNK_MAX:
+            chunks.append(current)
+            current = []
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _backup_changes(be: StorageBackend, filename: str, payload: dict,
+                    cached: bool = False) -> dict:
+    """
+    Turns a full backup payload (from _backup_payload) into the file
+    changes that store it: new chunks, the backup manifest, and the chunk
+    index (merged, so concurrent backups never drop each other's chunks).
+    """
+    index, _ = be.read(BACKUP_CHUNK_INDEX, cached)
+    known = set(index.get("chunks", [])) if index else set()
+    changes, ids, new = {}, [], []
+    for chunk in _chunk_records(payload["students"]):
+        cid = _digest(chunk)
+        ids.append(cid)
+        if cid not in known and cid not in new:
+            new.append(cid)
+            changes[f"{BACKUP_CHUNK_DIR}/{cid}.json"] = {"students": chunk}
+    meta = {k: v for k, v in payload.items() if k != "students"}
+    changes[filename] = {**meta, "chunks": ids}
+    entry = {"file": filename, **meta}
+    changes[BACKUP_CATALOGUE] = lambda content: {
+        "backups": [b for b in (content or {}).get("backups", [])
+                    if b["file"] != filename] + [entry]}
+    if new:
+        changes[BACKUP_CHUNK_INDEX] = lambda content: {
+            "chunks": sorted(set((content or {}).get("chunks", [])) | set(new))}
+    return changes
+
+_legacy_backups = None    # pre-catalogue backups; found once per process
+
+def list_backups() -> list:
+    """
+    Synchronous read — metadata of every backup, newest first, from the
+    catalogue. Backups written before the catalogue existed are found by
+    listing backups/ and shown with the time from their filename and an
+    unknown (None) count. Nothing writes such files any more, so that
+    listing (an uncached API call) is made once per process.
+    """
+    global _legacy_backups
+    be = _backend()
+    content, _ = be.read(BACKUP_CATALOGUE)
+    entries = list(content.get("backups", [])) if content else []
+    if _legacy_backups is None:
+        _legacy_backups = _scan_legacy_backups(be)
+    seen = {e["file"] for e in entries}
+    entries += [e for e in _legacy_backups if e["file"] not in seen]
+    return sorted(entries, key=lambda e: (e.get("backed_up_at") or "", e["file"]),
+                  reverse=True)
+
+def _scan_legacy_backups(be: StorageBackend) -> list:
+    entries = []
+    for path in be.list(BACKUP_DIR):
+        name = path.rsplit("/", 1)[-1]
+        if not name.startswith("students_backup_"):
+            continue
+        stamp = name[len("students_backup_"):][:15]
+        try:
+            when = datetime.strptime(stamp, "%Y%m%d_%H%M%S").strftime("%Y-%m-%d %H:%M:%S UTC")
+        except ValueError:
+            when = ""
+        entries.append({"file": path, "backed_up_at": when,
+                        "backed_up_by": None, "student_count": None})
+    return entries
+
+def load_backup(filename: str) -> list:
+    """Synchronous read — the full student list stored in a backup."""
+    be = _backend()
+    content, _ = be.read(filename)
+    if not content:
+        return []
+    if "students" in content:          # full backup from before chunking
+        return content["students"]
+    students = []
+    for cid in content.get("chunks", []):
+        chunk, _ = be.read(f"{BACKUP_CHUNK_DIR}/{cid}.json")
+        students += chunk["students"]
+    return students
+
+_backup_names_lock = threading.Lock()
+_last_backup_stamp = (None, 0)    # (stamp, backups already named with it)
+
+def _backup_payload(students_list: list, actor: str):
+    """Returns (filename, payload) for a full backup of students_list."""
+    global _last_backup_stamp
+    with _backup_names_lock:
+        stamp = _now_stamp()
+        n = _last_backup_stamp[1] + 1 if _last_backup_stamp[0] == stamp else 1
+        _last_backup_stamp = (stamp, n)
+    suffix = "" if n == 1 else f"_{n}"      # e.g. a restore right after a clear-all
+    filename = f"{BACKUP_DIR}/students_backup_{stamp}{suffix}.json"
+    return filename, {
         "backed_up_at":  _now(),
         "backed_up_by":  actor,
         "student_count": len(students_list),
-        "students":      students_list,
+        "students":      list(students_list),
     }
+
+def backup_students(students_list: list, actor: str) -> str:
+    """Queues a background backup write. Returns the filename immediately."""
+    filename, snapshot = _backup_payload(students_list, actor)
     try:
-        hdrs = _headers()
-        repo = _repo()
+        be = _backend()
     except Exception:
         return filename
-
-    snapshot = dict(payload)
-
-    def _do_backup():
-        try:
-            _write_file(filename, snapshot,
-                        f"PCAP backup by {actor} [{_now()}]",
-                        hdrs, repo, sha=None)
-        except Exception:
-            pass
-
-    _enqueue(_do_backup)
+    wal_id = _wal_record("backup", f"backup:{filename}",
+                         {"filename": filename, "payload": snapshot, "actor": actor})
+    _queue_backup(be, filename, snapshot, actor, wal_id)
     append_log(actor, "BACKUP_CREATED",
                f"Backup queued: {filename} ({len(students_list)} records)")
     return filename
 
-def clear_all_students(actor: str) -> str:
+def _queue_backup(be: StorageBackend, filename: str, snapshot: dict, actor: str,
+                  wal_id: int):
+    def _do_backup():
+        be.commit(_backup_changes(be, filename, snapshot, cached=True),
+                  f"PCAP backup by {actor} [{_now()}]")
+        _wal_confirm(f"backup:{filename}", wal_id)
+
+    _enqueue(_do_backup, label=f"backup {filename}", priority=PRIORITY_STUDENTS,
+             wal=(f"backup:{filename}", wal_id))
+
+def _replay_backup(be: StorageBackend, wal_id: int, args: dict):
+    _queue_backup(be, args["filename"], args["payload"], args["actor"], wal_id)
+
+def _replace_students(actor: str, new_students: list, action: str, detail,
+                      commit_msg: str) -> str:
     """
-    Backs up current records (background) then synchronously wipes students.json.
-    The wipe itself is synchronous so the caller knows it's done immediately.
+    Backs up the current records and replaces them with new_students in one
+    synchronous commit, together with the audit entries describing it, so
+    the caller knows it's done immediately. Only the new base goes out on
+    the UI thread: the backup is written to the WAL first and its chunks
+    (about one blob per backup_chunk_avg records not already stored) are
+    uploaded by the background writer, so a crash or failed upload can
+    replay it. detail(count, backup_file) is the audit detail for action.
     Returns the backup filename.
     """
-    current  = load_students()
-    backup_file = backup_students(current, actor)
-
-    # Wipe is synchronous — we need this done before returning to the UI
-    hdrs = _headers(); repo = _repo()
-    content, sha = _read_file(STUDENTS_PATH, hdrs, repo)
-    _write_file(
-        STUDENTS_PATH,
-        {"students": []},
-        f"PCAP CLEAR ALL by {actor} [{_now()}]",
-        hdrs, repo, sha,
-    )
-    append_log(actor, "CLEAR_ALL_STUDENTS",
-               f"Deleted {len(current)} records. Backup: {backup_file}")
+    global _students_gen
+    be = _backend()
+    with _students_commit_lock:          # waits out a student write already running
+        _students_gen += 1
+        _cancel_queued(STUDENTS_PATH)    # an older queued snapshot must not undo this
+        with _journal_lock:
+            pending = list(_journal_pending)     # not written yet, but belong in the backup
+        students_mark = _wal_mark(STUDENTS_PATH)
+        journal_mark  = _drop_pending_journal()
+        students, seq, journal = _read_student_files(be)
+        current = _replay_journal(_replay_journal(students, journal.get("ops", []), seq),
+                                  pending, -1)
+        backup_file, payload = _backup_payload(current, actor)
+        wal_id = _wal_record("backup", f"backup:{backup_file}",
+                             {"filename": backup_file, "payload": payload, "actor": actor})
+        _queue_backup(be, backup_file, payload, actor, wal_id)
+        append_log(actor, "BACKUP_CREATED",
+                   f"Backup queued: {backup_file} ({len(current)} records)")
+        append_log(actor, action, detail(len(current), backup_file))
+
+        _with_log_batch(be, _base_changes(new_students, journal.get("seq", 0)), commit_msg)
+    _wal_confirm(STUDENTS_PATH, students_mark)
+    _wal_confirm(STUDENTS_JOURNAL_PATH, journal_mark)
     return backup_file
+
+def restore_backup(filename: str, actor: str):
+    """
+    Makes a backup the live dataset (the current records are backed up
+    first — cheap, as their chunks are mostly stored already). Chunks are
+    read one at a time. Returns (restored students, backup of the replaced data).
+    """
+    restored = load_backup(filename)
+    backup_file = _replace_students(
+        actor, restored, "RESTORE_BACKUP",
+        lambda n, f: f"Restored {len(restored)} records from {filename} "
+                     f"(replacing {n}). Backup: {f}",
+        f"PCAP restore {filename} by {actor} [{_now()}]")
+    return restored, backup_file
+
+def clear_all_students(actor: str) -> str:
+    """Backs up current records and wipes them. Returns the backup filename."""
+    return _replace_students(
+        actor, [], "CLEAR_ALL_STUDENTS",
+        lambda n, f: f"Deleted {n} records. Backup: {f}",
+        f"PCAP CLEAR ALL by {actor} [{_now()}]")
+
+
+# Handlers that re-queue each kind of WAL record after a restart
+_WAL_HANDLERS = {
+    "log":      _replay_log,
+    "journal":  _replay_journal_ops,
+    "students": _replay_students,
+    "backup":   _replay_backup,
+    "theme":    _replay_theme,
+}
@@ -0,0 +1,319 @@
+"""
+The in-memory student roster: its compact columnar model, and derived
+views of it memoised per dataset version.
+
+Compact model — one copy is held per session, so the roster is stored as:
+  Name, Matric_Number, Jamb_Reg   Arrow-backed strings (object if pyarrow
+                                  is unavailable)
+  Department                      Categorical (a few dozen distinct values)
+  Flags                           uint8 bitmask of FLAG_BITS, replacing the
+                                  Olevel / School_Fees / Jamb columns;
+                                  eligible means Flags == ALL_FLAGS
+compact() builds it from the wide (record) layout, expanded() goes back for
+CSV export, diffs and tables; flag(row, "Olevel") reads one bit.
+EligibilityStats summarises it by department and missing requirement;
+read_roster_csv() validates an uploaded CSV into it, chunk by chunk.
+
+Derived views — the roster only changes when an admin publishes a new
+version (github_store.publish_students bumps the version on every
+mutation), so derived(version, df, name) builds each artifact once for the
+current version and hands the same object to every session and rerun
+after that. Artifacts are read-only — callers must not mutate them.
+
+  lower:<column>   the column as lowercased strings (Series, df's index)
+  departments      Department as a Categorical; .codes / .categories
+
+Only the newest version is kept. A frame that isn't the one cached for its
+version (a session holding a private copy) is served uncached, so a stale
+artifact can never be returned. Nothing here imports Streamlit.
+"""
+import re, threading
+import numpy as np
+import pandas as pd
+
+# ── Compact model ─────────────────────────────────────────────────────────────
+FLAG_BITS = {"Olevel": 1, "School_Fees": 2, "Jamb": 4}
+ALL_FLAGS = 7
+STRING_COLUMNS = ("Name", "Matric_Number", "Jamb_Reg")
+WIDE_COLUMNS = ["SN", "Name", "Matric_Number", "Jamb_Reg", "Department",
+                "Olevel", "School_Fees", "Jamb"]
+
+try:
+    import pyarrow
+    STRING_DTYPE = pd.ArrowDtype(pyarrow.string())
+except ImportError:
+    STRING_DTYPE = object
+
+def pack_flags(olevel: bool, fees: bool, jamb: bool) -> int:
+    return (FLAG_BITS["Olevel"] * bool(olevel) | FLAG_BITS["School_Fees"] * bool(fees)
+            | FLAG_BITS["Jamb"] * bool(jamb))
+
+def flag(row, name: str) -> bool:
+    """Whether requirement name ("Olevel", "School_Fees", "Jamb") is met for row."""
+    return bool(int(row["Flags"]) & FLAG_BITS[name])
+
+def compact(df):
+    """
+    df in the compact model. Accepts the wide layout (boolean Olevel /
+    School_Fees / Jamb, True only when exactly True) or an already compact
+    or partly compact frame, e.g. after concatenating a new row.
+    """
+    out = df.drop(columns=[c for c in FLAG_BITS if c in df.columns])
+    if "Flags" in df.columns:
+        flags = df["Flags"].fillna(0).to_numpy(dtype=np.uint8)
+    else:
+        flags = np.zeros(len(df), dtype=np.uint8)
+        for col, bit in FLAG_BITS.items():
+            if col in df.columns:
+                flags |= np.where(df[col].to_numpy() == True, bit, 0).astype(np.uint8)
+    out["Flags"] = flags
+    for col in STRING_COLUMNS:
+        if col in out.columns and out[col].dtype != STRING_DTYPE:
+            out[col] = out[col].astype(str).astype(STRING_DTYPE)
+    if "Department" in out.columns and not isinstance(out["Department"].dtype, pd.CategoricalDtype):
+        out["Department"] = out["Department"].astype(str).astype("category")
+    return out
+
+def expanded(df):
+    """df in the wide layout (plain str / bool columns, WIDE_COLUMNS order)."""
+    out = df.drop(columns=["Flags"])
+    for col, bit in FLAG_BITS.items():
+        out[col] = (df["Flags"].to_numpy() & bit) != 0
+    for col in STRING_COLUMNS + ("Department",):
+        if col in out.columns:
+            out[col] = out[col].astype(str).astype(object)
+    return out[[c for c in WIDE_COLUMNS if c in out.columns]
+               + [c for c in out.columns if c not in WIDE_COLUMNS]]
+
+def set_department(df, mask, value: str):
+    """Assign Department for the rows in mask, adding value as a category if new."""
+    if value not in df["Department"].cat.categories:
+        df["Department"] = df["Department"].cat.add_categories([value])
+    df.loc[mask, "Department"] = value
+
+
+# ── Eligibility statistics ────────────────────────────────────────────────────
+STAT_LABELS = {"Olevel": "No O'Level", "School_Fees": "No Fees", "Jamb": "No JAMB"}
+
+class EligibilityStats:
+    """
+    Student counts keyed by (Department, Flags) — at most a few hundred
+    entries, from which every total, per-department figure and per-missing-
+    requirement figure is summed. updated() applies an add/edit/delete by
+    moving the touched SNs between keys, without regrouping the roster.
+    Immutable, so it can be shared between sessions.
+    """
+
+    def __init__(self, counts: dict):
+        self.counts = counts        # (department, flags) -> students
+
+    @classmethod
+    def build(cls, df):
+        if df is None or df.empty:
+            return cls({})
+        sizes = df.groupby([df["Department"].astype(str), df["Flags"]], observed=True).size()
+        return cls({(dept, int(flags)): int(n) for (dept, flags), n in sizes.items() if n})
+
+    def updated(self, old_df, new_df, sns):
+        """The stats after the rows for sns changed from old_df to new_df."""
+        counts = dict(self.counts)
+        for df, sign in ((old_df, -1), (new_df, 1)):
+            if df is None or df.empty:
+                continue
+            rows = df[df["SN"].isin(sns)]
+            for key in zip(rows["Department"].astype(str).tolist(), rows["Flags"].astype(int).tolist()):
+                counts[key] = counts.get(key, 0) + sign
+        return EligibilityStats({k: n for k, n in counts.items() if n})
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    @property
+    def eligible(self) -> int:
+        return sum(n for (_, flags), n in self.counts.items() if flags == ALL_FLAGS)
+
+    def missing(self) -> dict:
+        """{"Olevel": students missing it, "School_Fees": …, "Jamb": …}"""
+        return {col: sum(n for (_, flags), n in self.counts.items() if not flags & bit)
+                for col, bit in FLAG_BITS.items()}
+
+    def by_department(self):
+        """One row per department: Students, Eligible, Pending, a column per
+        missing requirement (STAT_LABELS) and % Eligible; most pending first."""
+        rows = {}
+        for (dept, flags), n in self.counts.items():
+            row = rows.setdefault(dept, dict.fromkeys(["Students", "Eligible", *STAT_LABELS.values()], 0))
+            row["Students"] += n
+            row["Eligible"] += n if flags == ALL_FLAGS else 0
+            for col, bit in FLAG_BITS.items():
+                row[STAT_LABELS[col]] += 0 if flags & bit else n
+        table = pd.DataFrame.from_dict(rows, orient="index")
+        if table.empty:
+            return table
+        table.insert(2, "Pending", table["Students"] - table["Eligible"])
+        table["% Eligible"] = (100 * table["Eligible"] / table["Students"]).round(1)
+        table.index.name = "Department"
+        return table.sort_values(["Pending", "Students"], ascending=False).reset_index()
+
+
+# ── Record formats ────────────────────────────────────────────────────────────
+# Used by the add/edit forms, CSV import and exact-key search alike.
+MATRIC_PATTERN = re.compile(r"^\d{11}$")
+JAMB_PATTERN   = re.compile(r"^\d{12}[A-Za-z]{2}$")
+
+
+# ── CSV import ────────────────────────────────────────────────────────────────
+REQUIRED_COLUMNS = ["Name", "Matric_Number", "Jamb_Reg", "Department",
+                    "Olevel", "School_Fees", "Jamb"]
+IMPORT_CHUNK_ROWS = 50_000
+
+class CSVImportError(ValueError):
+    """The file can't be imported at all (unreadable, empty or missing columns)."""
+
+def _csv_chunks(source, chunksize: int):
+    try:
+        for chunk in pd.read_csv(source, dtype=str, keep_default_na=False,
+                                 chunksize=chunksize, skipinitialspace=True):
+            yield chunk
+    except pd.errors.EmptyDataError as e:
+        raise CSVImportError("The file is empty.") from e
+    except (ValueError, UnicodeDecodeError) as e:
+        raise CSVImportError(f"Could not read CSV: {e}") from e
+
+def _join_errors(errors, checks: list):
+    """Append each check's message to the rows its mask flags."""
+    for bad, message in checks:
+        errors = errors + bad.map({True: message + "; ", False: ""})
+    return errors
+
+def read_roster_csv(source, departments, bool_map: dict, chunksize: int = IMPORT_CHUNK_ROWS):
+    """
+    Validate a roster CSV IMPORT_CHUNK_ROWS rows at a time. Returns
+    (valid, rejected): valid is the accepted rows in the compact model;
+    rejected keeps the offending rows as uploaded, with their CSV line
+    number (Row) and every rule they broke (Errors).
+
+    Rules, all applied column-wise: Name present; Matric_Number and
+    Jamb_Reg in the add form's formats; Department one of departments;
+    Olevel / School_Fees / Jamb readable through bool_map; SN, if the file
+    has it, a positive whole number — otherwise accepted rows are numbered
+    1..n. Matric_Number, Jamb_Reg and SN must not repeat: a value belongs
+    to the first row that passes every other rule, and any later row that
+    has it is rejected, whatever the chunk size. Only valid rows are kept between chunks, already
+    compacted, so memory stays close to the size of the final roster.
+    Raises CSVImportError if the file can't be read or lacks a column.
+    """
+    depts = pd.CategoricalDtype(sorted(set(departments)))
+    seen = {"Matric_Number": set(), "Jamb_Reg": set(), "SN": set()}
+    valid, rejected, first_line, has_sn = [], [], 2, None
+
+    for chunk in _csv_chunks(source, chunksize):
+        chunk.columns = chunk.columns.str.strip()
+        if has_sn is None:
+            missing = [c for c in REQUIRED_COLUMNS if c not in chunk.columns]
+            if missing:
+                raise CSVImportError(f"Missing columns: {', '.join(missing)}")
+            has_sn = "SN" in chunk.columns
+            if not has_sn:
+                del seen["SN"]
+        chunk.index = pd.RangeIndex(first_line, first_line + len(chunk), name="Row")
+        first_line += len(chunk)
+        data = pd.DataFrame({c: chunk[c].str.strip()
+                             for c in REQUIRED_COLUMNS + (["SN"] if has_sn else [])})
+        data["Jamb_Reg"] = data["Jamb_Reg"].str.upper()
+        for col in FLAG_BITS:
+            data[col] = data[col].str.lower().map(bool_map)
+        if has_sn:
+            data["SN"] = pd.to_numeric(data["SN"], errors="coerce")
+
+        checks = [
+            (data["Name"] == "", "Name is required"),
+            (~data["Matric_Number"].str.match(MATRIC_PATTERN), "Matric Number must be 11 digits"),
+            (~data["Jamb_Reg"].str.match(JAMB_PATTERN), "JAMB Reg must be 12 digits + 2 letters"),
+            (~data["Department"].isin(depts.categories), "Unknown Department"),
+        ] + [(data[col].isna(), f"{col} must be true/false") for col in FLAG_BITS]
+        if has_sn:
+            checks.append((~((data["SN"] > 0) & (data["SN"] % 1 == 0)),
+                           "S/N must be a positive whole number"))
+        errors = _join_errors(pd.Series("", index=chunk.index, dtype=object), checks)
+
+        # Keys are claimed by rows that pass every other check, so whether a
+        # row is a duplicate never depends on where the chunks split.
+        # (object dtype: Arrow-string isin against a large set is much slower)
+        clean = data[errors == ""]
+        errors = _join_errors(errors, [
+            ((clean[col].duplicated() | clean[col].astype(object).isin(seen[col]))
+             .reindex(chunk.index, fill_value=False), f"Duplicate {label}")
+            for col, label in (("Matric_Number", "Matric Number"), ("Jamb_Reg", "JAMB Reg"),
+                               ("SN", "S/N")) if col in seen])
+        for col in seen:
+            seen[col].update(clean[col].tolist())
+
+        ok = errors == ""
+        good = data[ok]
+        if not ok.all():
+            bad = chunk[~ok].copy()
+            bad["Errors"] = errors[~ok].str.rstrip("; ")
+            rejected.append(bad.reset_index())
+        if not good.empty:
+            valid.append(compact(good.assign(Department=good["Department"].astype(depts))
+                                 .reset_index(drop=True)))
+
+    if has_sn is None:
+        raise CSVImportError("The file is empty.")
+    valid = (pd.concat(valid, ignore_index=True) if valid
+             else compact(pd.DataFrame(columns=REQUIRED_COLUMNS)))
+    sn = valid.pop("SN").astype(int) if "SN" in valid.columns else range(1, len(valid) + 1)
+    valid.insert(0, "SN", sn)
+    rejected = (pd.concat(rejected, ignore_index=True) if rejected
+                else pd.DataFrame(columns=["Row", "Errors"]))
+    return valid, rejected
+
+
+# ── Derived views ─────────────────────────────────────────────────────────────
+
+_BUILDERS: dict = {}
+
+def _artifact(prefix: str):
+    def register(fn):
+        _BUILDERS[prefix] = fn
+        return fn
+    return register
+
+@_artifact("departments")
+def _departments(version, df, _arg):
+    col = df["Department"]
+    return (col.array if isinstance(col.dtype, pd.CategoricalDtype)
+            else pd.Categorical(col.astype(str)))
+
+@_artifact("lower")
+def _lower(version, df, col):
+    if col == "Department":
+        # A handful of distinct values: lowercase the categories, not every row
+        cat = derived(version, df, "departments")
+        return pd.Series(cat.categories.str.lower().to_numpy()[cat.codes], index=df.index)
+    return df[col].astype(str).str.lower()
+
+
+_lock  = threading.Lock()
+_cache = (None, None, {})   # (version, df, {name: artifact})
+
+def derived(version: int, df, name: str):
+    """Artifact `name` of df, which is dataset version `version`."""
+    global _cache
+    prefix, _, arg = name.partition(":")
+    if prefix not in _BUILDERS:
+        raise KeyError(f"Unknown roster artifact: {name}")
+    with _lock:
+        have, cached_df, items = _cache
+        if have == version and cached_df is df and name in items:
+            return items[name]
+    value = _BUILDERS[prefix](version, df, arg or None)
+    with _lock:
+        have, cached_df, items = _cache
+        if have is None or version > have:
+            _cache = (version, df, {name: value})
+        elif have == version and cached_df is df:
+            _cache = (version, df, {**items, name: value})
+    return value
@@ -0,0 +1,238 @@
+"""
+Trigram inverted index for substring search over the student roster.
+
+Each indexed column maps every 3-character substring of its normalised
+(str, lowercased) values to the set of record ids containing it. A search
+term of 3+ characters can only occur in a value that contains all of the
+term's trigrams, so intersecting those posting sets gives a short candidate
+list, which is then checked with a plain substring test — results are
+exactly those of str.lower().str.contains(term) for literal terms.
+
+Indexes are immutable once built: updated() and extended() return a new
+index that shares every posting set they did not have to touch
+(copy-on-write), so sessions still searching an older dataset version are
+never disturbed. Columns can be added on first use, so a roster that is
+only ever searched by name never pays for indexing the rest.
+
+FuzzyNameIndex answers misspelt name queries ("Okonkow" -> "Okonkwo") from
+a BK-tree over the roster's name words, so only a small part of the
+vocabulary is ever compared against the query.
+Nothing here imports Streamlit.
+"""
+import re, threading, unicodedata
+
+# Terms str.contains would treat as a regular expression can't be answered here
+_REGEX_CHARS = re.compile(r"[.^$*+?{}\[\]\\|()]")
+
+
+def _trigrams(value: str) -> set:
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+def _normalised(series) -> list:
+    return series.astype(str).str.lower().tolist()
+
+
+class TrigramIndex:
+    """
+    postings[column][trigram] -> set of ids; values[column][id] -> normalised
+    value. Ids come from id_col (SN), which must be unique in the frame.
+    """
+
+    def __init__(self, columns: tuple, id_col: str = "SN"):
+        self.columns  = tuple(columns)
+        self.id_col   = id_col
+        self.postings = {c: {} for c in self.columns}
+        self.values   = {c: {} for c in self.columns}
+
+    @classmethod
+    def build(cls, df, columns: tuple, id_col: str = "SN"):
+        """Index every row of df, or return None if its ids are not unique."""
+        if df[id_col].duplicated().any():
+            return None
+        return cls((), id_col).extended(df, columns)
+
+    def extended(self, df, columns: tuple):
+        """A new index that also covers columns, built from df (same version)."""
+        new = TrigramIndex(self.columns + tuple(c for c in columns if c not in self.columns),
+                           self.id_col)
+        ids = df[self.id_col].tolist()
+        for col in new.columns:
+            if col in self.columns:
+                new.postings[col], new.values[col] = self.postings[col], self.values[col]
+                continue
+            postings, values = new.postings[col], new.values[col]
+            by_value = {}              # columns like Department repeat a few values
+            for doc, value in zip(ids, _normalised(df[col])):
+                values[doc] = value
+                by_value.setdefault(value, []).append(doc)
+            for value, docs in by_value.items():
+                for gram in _trigrams(value):
+                    postings.setdefault(gram, set()).update(docs)
+        return new
+
+    def updated(self, df, ids):
+        """
+        A new index reflecting df for the given ids (added, edited or, when
+        absent from df, deleted); everything else is shared with self.
+        Returns None if df's ids are not unique.
+        """
+        rows = df[df[self.id_col].isin(ids)]
+        if rows[self.id_col].duplicated().any():
+            return None
+        new = TrigramIndex(self.columns, self.id_col)
+        row_ids = rows[self.id_col].tolist()
+        for col in self.columns:
+            postings, values = dict(self.postings[col]), dict(self.values[col])
+            copied = set()
+
+            def _posting(gram):
+                if gram not in copied:
+                    postings[gram] = set(postings.get(gram, ()))
+                    copied.add(gram)
+                return postings[gram]
+
+            for doc in ids:
+                old = values.pop(doc, None)
+                for gram in _trigrams(old) if old is not None else ():
+                    _posting(gram).discard(doc)
+            for doc, value in zip(row_ids, _normalised(rows[col])):
+                values[doc] = value
+                for gram in _trigrams(value):
+                    _posting(gram).add(doc)
+            for gram in copied:
+                if not postings[gram]:
+                    del postings[gram]
+            new.postings[col], new.values[col] = postings, values
+        return new
+
+    @staticmethod
+    def answers(term: str) -> bool:
+        """Whether search() can answer term with str.contains semantics."""
+        return len(term) >= 3 and not _REGEX_CHARS.search(term)
+
+    def search(self, term: str, columns: tuple = None) -> set:
+        """Ids whose value in any of columns contains term (lowercased)."""
+        term = term.lower()
+        grams = _trigrams(term)
+        hits = set()
+        for col in columns or self.columns:
+            postings, values = self.postings[col], self.values[col]
+            sets = sorted((postings.get(g, set()) for g in grams), key=len)
+            if not sets or not sets[0]:
+                continue
+            candidates = set.intersection(*sets) if len(sets) > 1 else sets[0]
+            hits.update(doc for doc in candidates if term in values[doc])
+        return hits
+
+
+# ── Typo-tolerant name search ─────────────────────────────────────────────────
+
+def levenshtein(a: str, b: str) -> int:
+    """Edit distance (insertions, deletions, substitutions) between a and b."""
+    if len(a) < len(b):
+        a, b = b, a
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over words under edit distance. A query for words
+    within d of w only descends into children whose edge distance lies in
+    [dist - d, dist + d] (triangle inequality), so it touches a small part
+    of the vocabulary. Insert-only and safe to share between threads.
+    """
+
+    def __init__(self):
+        self._root  = None     # (word, {distance: child node})
+        self._words = set()
+        self._lock  = threading.Lock()
+
+    def __contains__(self, word: str) -> bool:
+        return word in self._words
+
+    def add(self, word: str):
+        with self._lock:
+            if word in self._words:
+                return
+            self._words.add(word)
+            if self._root is None:
+                self._root = (word, {})
+                return
+            node = self._root
+            while True:
+                d = levenshtein(word, node[0])
+                child = node[1].get(d)
+                if child is None:
+                    node[1][d] = (word, {})
+                    return
+                node = child
+
+    def search(self, word: str, max_dist: int) -> list:
+        """[(distance, match)] for every stored word within max_dist of word."""
+        with self._lock:
+            found, stack = [], [self._root] if self._root else []
+            while stack:
+                node = stack.pop()
+                d = levenshtein(word, node[0])
+                if d <= max_dist:
+                    found.append((d, node[0]))
+                stack.extend(child for edge, child in node[1].items()
+                             if d - max_dist <= edge <= d + max_dist)
+            return found
+
+
+def name_tokens(name: str) -> list:
+    """
+    Lowercased alphabetic words of a name, accents folded away
+    ("O'Brien" -> ["obrien"], "Ṣọlá" -> ["sola"]).
+    """
+    plain = "".join(c for c in unicodedata.normalize("NFKD", str(name))
+                    if not unicodedata.combining(c))
+    return [t for t in re.sub(r"[^a-z\s]", "", plain.casefold()).split() if t]
+
+
+def _typo_budget(token: str) -> int:
+    return 0 if len(token) <= 2 else 1 if len(token) <= 5 else 2
+
+
+class FuzzyNameIndex:
+    """
+    Ranks records by how closely their name words match a query's words.
+    The vocabulary lives in a BKTree that may be shared across dataset
+    versions (a stale extra word is harmless); which records use each word
+    is per version.
+    """
+
+    def __init__(self, df, tree: BKTree, id_col: str = "SN", name_col: str = "Name"):
+        self.tree = tree
+        self.postings = {}
+        for doc, name in zip(df[id_col].tolist(), df[name_col].tolist()):
+            for token in name_tokens(name):
+                self.postings.setdefault(token, set()).add(doc)
+        for token in self.postings:
+            tree.add(token)
+
+    def search(self, query: str, k: int = 5) -> list:
+        """
+        Up to k ids, best first: fewest query words left unmatched, then
+        smallest total edit distance. Each query word may be misspelt by one
+        edit (3-5 letters) or two (6+); words of 1-2 letters must match.
+        """
+        words = name_tokens(query)
+        best = {}    # doc -> [distance per query word]
+        for i, word in enumerate(words):
+            for dist, token in self.tree.search(word, _typo_budget(word)):
+                for doc in self.postings.get(token, ()):
+                    dists = best.setdefault(doc, [None] * len(words))
+                    if dists[i] is None or dist < dists[i]:
+                        dists[i] = dist
+        ranked = sorted(best.items(), key=lambda item: (
+            sum(d is None for d in item[1]), sum(d for d in item[1] if d is not None), item[0]))
+        return [doc for doc, _ in ranked[:k]]
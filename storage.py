@@ -0,0 +1,443 @@
+"""
+Storage backends for FUTO PCAP.
+
+github_store keeps all PCAP data as JSON documents at repo-relative paths
+(students.json, admins.json, logs/…, backups/…). A backend only knows how to
+read, write and commit those documents; github_store decides what goes in
+them. Two implementations:
+
+  GitHubBackend — the GitHub Contents + Git Data APIs (production default)
+  LocalBackend  — a directory on local disk, written with fsync + atomic
+                  rename (offline runs, benchmarks, on-prem deployments)
+
+github_store picks one from the [store] secrets table (backend = "local").
+Nothing here imports Streamlit, so backends can be built and driven from
+plain scripts.
+"""
+import os, json, gzip, time, base64, hashlib, tempfile, threading
+import requests
+
+GITHUB_API = "https://api.github.com"
+
+# Documents are stored as compact JSON. Ones of at least gzip_min_bytes are
+# gzipped behind a format header so readers can tell them apart; plain JSON
+# (including the older indented files) is read as before.
+GZIP_HEADER    = b"PCAPZ1\n"
+GZIP_MIN_BYTES = 1 << 20      # 0 turns compression off
+CONTENTS_MAX_BYTES = 1 << 20  # larger files bypass the Contents API
+
+
+class StorageBackend:
+    """
+    Interface shared by every backend. Paths are relative, "/"-separated.
+
+    read(path, cached)                -> (parsed_content, sha) or (None, None)
+    write(path, payload, msg, sha)    -> new sha
+    commit(changes, msg)              -> {path: sha}; all changes land together
+    list(directory)                   -> paths of the files directly inside it
+
+    A payload is either the document to store or a callable that receives
+    the file's current content and returns it (used for appends and
+    read-modify-write updates, recomputed if the write has to be retried).
+    commit's changes map path → payload, or None to delete the file.
+
+    write with an explicit sha fails with StorageConflict unless it still
+    matches the stored file. Without one, the backend uses the sha it last
+    saw and reconciles a conflict itself: a callable is re-applied to the
+    fresh content, a plain payload overwrites it.
+
+    read(path, cached=True) may answer from what this process last read or
+    wrote without asking the store — fine for the background writer, which
+    is the only thing writing. Parsed content returned by read may be cached
+    and shared — treat it as read-only.
+
+    rate_limit() reports the quota the store last advertised, as
+    (remaining, reset_at, blocked_until) in epoch seconds, each None when
+    unknown or not applicable; the write scheduler paces itself from it.
+    """
+    name = "base"
+    gzip_min_bytes = GZIP_MIN_BYTES
+
+    def rate_limit(self):
+        return None, None, None
+
+    def read(self, path: str, cached: bool = False):
+        raise NotImplementedError
+
+    def write(self, path: str, payload, commit_msg: str, sha: str = None) -> str:
+        raise NotImplementedError
+
+    def commit(self, changes: dict, commit_msg: str) -> dict:
+        raise NotImplementedError
+
+    def list(self, directory: str) -> list:
+        raise NotImplementedError
+
+
+class StorageConflict(Exception):
+    """A write's expected sha no longer matches the stored file."""
+
+
+def _encode_payload(payload, gzip_min_bytes: int = 0) -> bytes:
+    data = json.dumps(payload, separators=(",", ":")).encode()
+    if gzip_min_bytes and len(data) >= gzip_min_bytes:
+        return GZIP_HEADER + gzip.compress(data, mtime=0)
+    return data
+
+def _decode_payload(data: bytes):
+    if data.startswith(GZIP_HEADER):
+        data = gzip.decompress(data[len(GZIP_HEADER):])
+    return json.loads(data.decode())
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# GITHUB  (Contents API for single files, Git Data API for multi-file commits)
+# ══════════════════════════════════════════════════════════════════════════════
+
+class GitHubBackend(StorageBackend):
+    """
+    Every call goes through one keep-alive session shared by the main thread
+    and the background writer, so requests reuse warm TLS connections to
+    api.github.com instead of handshaking each time.
+
+    Reads are revalidated with conditional GETs: the ETag, parsed content
+    and blob sha of each path are cached, and a 304 reply hands back the
+    cached object without re-downloading or re-decoding it (GitHub does not
+    count 304s against the rate limit).
+
+    Successful writes record the new blob sha and the content written, so
+    the next write to that path needs no read first. A 409/422 from a stale
+    sha triggers one fresh read and a reconciled retry.
+
+    The Contents API leaves the content out of files over 1 MB, so those
+    are fetched from the blobs endpoint as raw bytes, and writes over that
+    size go through the Git Data API as a one-file commit.
+
+    The Contents API makes one commit per file, so commit() with several
+    files goes through blobs → tree → commit → ref update instead. The branch
+    head we last saw is cached; if another writer moved it, the ref update is
+    rejected and we rebase onto the new head.
+    """
+    name = "github"
+
+    def __init__(self, token: str, repo: str, api: str = GITHUB_API,
+                 pool_connections: int = 4, pool_maxsize: int = 16,
+                 timeout: tuple = (5.0, 15.0), gzip_min_bytes: int = GZIP_MIN_BYTES):
+        from requests.adapters import HTTPAdapter
+        self.repo    = repo
+        self.api     = api
+        self.timeout = timeout
+        self.gzip_min_bytes = gzip_min_bytes
+        self.headers = {
+            "Authorization": f"token {token}",
+            "Accept": "application/vnd.github+json",
+        }
+        adapter = HTTPAdapter(pool_connections=pool_connections,
+                              pool_maxsize=pool_maxsize,
+                              max_retries=0)    # retries are handled by the write queue
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._read_cache = {}      # path -> (etag or None, parsed_content, sha)
+        self._cache_lock = threading.Lock()
+        self._head       = None    # (commit_sha, tree_sha) of the branch head
+        self._branch     = None
+        self._rate       = (None, None, None)
+
+    def _gh(self, method: str, url: str, headers: dict = None, **kwargs) -> requests.Response:
+        r = self.session.request(method, url, headers=headers or self.headers,
+                                 timeout=self.timeout, **kwargs)
+        self._note_rate_limit(r)
+        return r
+
+    def _note_rate_limit(self, r: requests.Response):
+        """Keep the quota from X-RateLimit-* and any Retry-After back-off."""
+        remaining, reset, blocked = self._rate
+        try:
+            if "X-RateLimit-Remaining" in r.headers:
+                remaining = int(r.headers["X-RateLimit-Remaining"])
+                reset     = float(r.headers.get("X-RateLimit-Reset", 0)) or None
+            if "Retry-After" in r.headers:
+                blocked = time.time() + float(r.headers["Retry-After"])
+        except ValueError:
+            return
+        self._rate = (remaining, reset, blocked)
+
+    def rate_limit(self):
+        return self._rate
+
+    def _forget_cached(self, path: str):
+        with self._cache_lock:
+            self._read_cache.pop(path, None)
+
+    def _remember(self, path: str, content, sha: str):
+        """Record content we just wrote. No ETag: the next plain read refetches."""
+        with self._cache_lock:
+            self._read_cache[path] = (None, content, sha)
+
+    # ── Single files (Contents API) ───────────────────────────────────────────
+    def read(self, path: str, cached: bool = False):
+        url = f"{self.api}/repos/{self.repo}/contents/{path}"
+        with self._cache_lock:
+            entry = self._read_cache.get(path)
+        if cached and entry:
+            return entry[1], entry[2]
+        etag = entry[0] if entry else None
+        headers = {**self.headers, "If-None-Match": etag} if etag else None
+        r = self._gh("GET", url, headers)
+        if r.status_code == 304 and etag:
+            return entry[1], entry[2]
+        if r.status_code == 404:
+            self._forget_cached(path)
+            return None, None
+        r.raise_for_status()
+        data = r.json()
+        if data.get("encoding") == "base64" and data.get("content"):
+            raw = base64.b64decode(data["content"])
+        else:
+            raw = self._read_blob(data["sha"])   # over 1 MB: content left out
+        content = _decode_payload(raw)
+        etag = r.headers.get("ETag")
+        if etag:
+            with self._cache_lock:
+                self._read_cache[path] = (etag, content, data["sha"])
+        return content, data["sha"]
+
+    def _read_blob(self, sha: str) -> bytes:
+        r = self._gh("GET", f"{self.api}/repos/{self.repo}/git/blobs/{sha}",
+                     {**self.headers, "Accept": "application/vnd.github.raw"})
+        r.raise_for_status()
+        return r.content
+
+    def write(self, path: str, payload, commit_msg: str, sha: str = None) -> str:
+        url    = f"{self.api}/repos/{self.repo}/contents/{path}"
+        strict = sha is not None
+        for attempt in range(2):
+            content = None
+            if not strict or callable(payload):
+                # Known sha from our last read/write; a fresh read only when
+                # we know nothing about the file or the known sha was stale.
+                content, known = self.read(path, cached=(attempt == 0))
+                sha = sha if strict else known
+            data = payload(content) if callable(payload) else payload
+            encoded = _encode_payload(data, self.gzip_min_bytes)
+            if len(encoded) > CONTENTS_MAX_BYTES and not strict:
+                return self._git_commit({path: payload}, commit_msg)[path]
+            body = {"message": commit_msg,
+                    "content": base64.b64encode(encoded).decode()}
+            if sha:
+                body["sha"] = sha
+            r = self._gh("PUT", url, json=body)
+            if r.status_code in (409, 422):
+                self._forget_cached(path)
+                if strict or attempt:
+                    raise StorageConflict(path)
+                continue           # our sha was stale — re-read and reconcile
+            r.raise_for_status()
+            resp = r.json()
+            commit = resp.get("commit") or {}
+            if commit.get("sha") and commit.get("tree"):
+                self._head = (commit["sha"], commit["tree"]["sha"])
+            self._remember(path, data, resp["content"]["sha"])
+            return resp["content"]["sha"]
+
+    def list(self, directory: str) -> list:
+        r = self._gh("GET", f"{self.api}/repos/{self.repo}/contents/{directory}")
+        if r.status_code == 404:
+            return []
+        r.raise_for_status()
+        entries = r.json()
+        if not isinstance(entries, list):
+            return []
+        return sorted(e["path"] for e in entries if e.get("type") == "file")
+
+    # ── Multi-file commits (Git Data API) ─────────────────────────────────────
+    def _default_branch(self) -> str:
+        if self._branch is None:
+            r = self._gh("GET", f"{self.api}/repos/{self.repo}")
+            r.raise_for_status()
+            self._branch = r.json()["default_branch"]
+        return self._branch
+
+    def _fetch_head(self, branch: str):
+        base = f"{self.api}/repos/{self.repo}/git"
+        r = self._gh("GET", f"{base}/ref/heads/{branch}")
+        r.raise_for_status()
+        commit = r.json()["object"]["sha"]
+        r = self._gh("GET", f"{base}/commits/{commit}")
+        r.raise_for_status()
+        self._head = (commit, r.json()["tree"]["sha"])
+        return self._head
+
+    def commit(self, changes: dict, commit_msg: str) -> dict:
+        # A single written file goes through the cheaper Contents API
+        if len(changes) == 1:
+            (path, payload), = changes.items()
+            if payload is not None:
+                return {path: self.write(path, payload, commit_msg)}
+        return self._git_commit(changes, commit_msg)
+
+    def _git_commit(self, changes: dict, commit_msg: str) -> dict:
+        base   = f"{self.api}/repos/{self.repo}/git"
+        branch = self._default_branch()
+        blob_shas, written = {}, {}
+        for attempt in range(4):
+            head = self._head if attempt == 0 else None
+            parent, base_tree = head or self._fetch_head(branch)
+            entries = []
+            for path, payload in changes.items():
+                if payload is None:
+                    entries.append({"path": path, "mode": "100644", "type": "blob", "sha": None})
+                    continue
+                if callable(payload) or path not in blob_shas:
+                    if callable(payload):
+                        # Our cache is current unless the branch moved under us
+                        content, _ = self.read(path, cached=(attempt == 0))
+                        payload = payload(content)
+                    r = self._gh("POST", f"{base}/blobs", json={
+                        "content":  base64.b64encode(
+                            _encode_payload(payload, self.gzip_min_bytes)).decode(),
+                        "encoding": "base64",
+                    })
+                    r.raise_for_status()
+                    blob_shas[path] = r.json()["sha"]
+                    written[path]   = payload
+                entries.append({"path": path, "mode": "100644", "type": "blob",
+                                "sha": blob_shas[path]})
+            r = self._gh("POST", f"{base}/trees",
+                         json={"base_tree": base_tree, "tree": entries})
+            r.raise_for_status()
+            tree = r.json()["sha"]
+            r = self._gh("POST", f"{base}/commits",
+                         json={"message": commit_msg, "tree": tree, "parents": [parent]})
+            r.raise_for_status()
+            commit = r.json()["sha"]
+            r = self._gh("PATCH", f"{base}/refs/heads/{branch}", json={"sha": commit})
+            if r.status_code == 422:
+                continue           # not a fast-forward — the branch moved, rebase
+            r.raise_for_status()
+            self._head = (commit, tree)
+            for path in changes:
+                if path in written:
+                    self._remember(path, written[path], blob_shas[path])
+                else:
+                    self._forget_cached(path)
+            return blob_shas
+        raise RuntimeError(f"Could not update {branch}: the branch kept moving")
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# LOCAL DISK
+# ══════════════════════════════════════════════════════════════════════════════
+
+class LocalBackend(StorageBackend):
+    """
+    Documents live under root/ at the same relative paths used on GitHub.
+    Every file is written to a temporary sibling, fsync'd and renamed over
+    the target, so readers and crashes only ever see a whole old or a whole
+    new file. The sha is the git blob hash of the stored bytes, which keeps
+    the optimistic-concurrency contract of the GitHub backend.
+
+    commit() stages every file first and only then renames them into
+    place, so a failure while encoding or staging changes nothing on disk.
+    """
+    name = "local"
+
+    def __init__(self, root: str, gzip_min_bytes: int = GZIP_MIN_BYTES):
+        self.root  = os.path.abspath(root)
+        self.gzip_min_bytes = gzip_min_bytes
+        self._lock = threading.RLock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _abs(self, path: str) -> str:
+        full = os.path.abspath(os.path.join(self.root, path))
+        if not full.startswith(self.root + os.sep):
+            raise ValueError(f"Path escapes the storage root: {path}")
+        return full
+
+    @staticmethod
+    def _sha(data: bytes) -> str:
+        return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+    def _read_bytes(self, path: str):
+        try:
+            with open(self._abs(path), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def read(self, path: str, cached: bool = False):
+        data = self._read_bytes(path)
+        if data is None:
+            return None, None
+        return _decode_payload(data), self._sha(data)
+
+    def list(self, directory: str) -> list:
+        full = self._abs(directory)
+        try:
+            names = os.listdir(full)
+        except FileNotFoundError:
+            return []
+        return sorted(f"{directory}/{n}" for n in names
+                      if not n.startswith(".tmp-") and os.path.isfile(os.path.join(full, n)))
+
+    def _stage(self, path: str, data: bytes) -> str:
+        """Write data to an fsync'd temp file next to path; returns its name."""
+        full = self._abs(path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(full))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return tmp
+
+    @staticmethod
+    def _fsync_dir(directory: str):
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return                 # e.g. Windows: directories can't be opened
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def write(self, path: str, payload, commit_msg: str, sha: str = None) -> str:
+        with self._lock:
+            current = self._read_bytes(path)
+            if sha is not None and self._sha(current or b"") != sha:
+                raise StorageConflict(path)
+            return self.commit({path: payload}, commit_msg)[path]
+
+    def commit(self, changes: dict, commit_msg: str) -> dict:
+        with self._lock:
+            staged, shas = [], {}
+            try:
+                for path, payload in changes.items():
+                    if payload is None:
+                        continue
+                    if callable(payload):
+                        payload = payload(self.read(path)[0])
+                    data = _encode_payload(payload, self.gzip_min_bytes)
+                    staged.append((self._stage(path, data), self._abs(path)))
+                    shas[path] = self._sha(data)
+            except BaseException:
+                for tmp, _ in staged:
+                    os.unlink(tmp)
+                raise
+            for tmp, full in staged:
+                os.replace(tmp, full)
+            for path, payload in changes.items():
+                if payload is None:
+                    try:
+                        os.unlink(self._abs(path))
+                    except FileNotFoundError:
+                        pass
+            for d in {os.path.dirname(self._abs(p)) for p in changes}:
+                self._fsync_dir(d)
+            return shas
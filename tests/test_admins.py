@@ -0,0 +1,21 @@
+"""Admin directory writes (LocalBackend)."""
+import github_store as gs
+from storage import LocalBackend
+
+
+def test_create_admin_rechecks_username_against_stored_admins(tmp_path, monkeypatch):
+    be = LocalBackend(str(tmp_path))
+    be.write(gs.ADMINS_PATH, {"admins": []}, "seed")
+    monkeypatch.setattr(gs, "_backend_obj", be)
+    monkeypatch.setattr(gs, "_admin_dir", None)
+    monkeypatch.setattr(gs, "ADMIN_CACHE_TTL", 3600.0)
+    monkeypatch.setattr(gs, "append_log", lambda *a, **k: None)
+    assert gs.load_admins() == []                    # cached before the other write
+
+    other = LocalBackend(str(tmp_path))              # another replica creates bob
+    other.write(gs.ADMINS_PATH, {"admins": [{"username": "bob", "password_hash": "x"}]}, "bob")
+
+    ok, reason = gs.create_admin("BOB", "pw", "+1", "ada")
+    assert not ok and reason
+    stored, _ = other.read(gs.ADMINS_PATH)
+    assert [a["username"] for a in stored["admins"]] == ["bob"]
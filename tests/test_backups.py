@@ -0,0 +1,20 @@
+"""Backup catalogue listing (LocalBackend)."""
+import github_store as gs
+from storage import LocalBackend
+
+
+def test_list_backups_scans_for_legacy_files_once(tmp_path, monkeypatch):
+    be = LocalBackend(str(tmp_path))
+    be.write(f"{gs.BACKUP_DIR}/students_backup_20240101_120000.json", {"students": []}, "old")
+    be.write(gs.BACKUP_CATALOGUE, {"backups": [
+        {"file": f"{gs.BACKUP_DIR}/students_backup_20261017_090000.json",
+         "backed_up_at": "2026-10-17 09:00:00 UTC", "backed_up_by": "ada", "student_count": 3}]},
+        "catalogue")
+    monkeypatch.setattr(gs, "_backend_obj", be)
+    monkeypatch.setattr(gs, "_legacy_backups", None)
+    listing, calls = be.list, []
+    monkeypatch.setattr(be, "list", lambda d: calls.append(d) or listing(d))
+
+    for _ in range(2):
+        assert [b["file"].rsplit("_", 2)[1] for b in gs.list_backups()] == ["20261017", "20240101"]
+    assert calls == [gs.BACKUP_DIR]
@@ -0,0 +1,148 @@
+"""GitHubBackend conflict handling, against a stubbed session.request."""
+import base64, hashlib, json, re
+
+import requests
+
+from storage import GitHubBackend
+
+API, REPO = "https://gh.test", "owner/data"
+
+
+class FakeGitHub:
+    """Just enough of the Contents and Git Data APIs, on one branch."""
+
+    def __init__(self):
+        self.blobs, self.trees, self.commits = {}, {}, {}
+        self.head = self._commit({}, None)
+        self.calls = []
+
+    def _sha(self, *parts) -> str:
+        return hashlib.sha1(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+    def _blob(self, data: bytes) -> str:
+        sha = self._sha(data.decode())
+        self.blobs[sha] = data
+        return sha
+
+    def _tree(self, files: dict) -> str:
+        sha = self._sha(files)
+        self.trees[sha] = dict(files)
+        return sha
+
+    def _commit(self, files: dict, parent) -> str:
+        tree = self._tree(files)
+        sha = self._sha(tree, parent, len(self.commits))
+        self.commits[sha] = (tree, parent)
+        return sha
+
+    def files(self) -> dict:
+        return self.trees[self.commits[self.head][0]]
+
+    def push(self, path: str, content):
+        """Another writer commits path directly."""
+        files = {**self.files(), path: self._blob(json.dumps(content).encode())}
+        self.head = self._commit(files, self.head)
+
+    def stored(self, path: str):
+        return json.loads(self.blobs[self.files()[path]])
+
+    def request(self, method, url, headers=None, timeout=None, json=None):
+        route = url[len(f"{API}/repos/{REPO}"):]
+        self.calls.append((method, route))
+        m = re.fullmatch(r"/contents/(.+)", route)
+        if m and method == "GET":
+            sha = self.files().get(m.group(1))
+            if sha is None:
+                return _response(404, {"message": "Not Found"})
+            return _response(200, {"sha": sha, "encoding": "base64",
+                                   "content": base64.b64encode(self.blobs[sha]).decode()},
+                             {"ETag": f'"{sha}"'})
+        if m and method == "PUT":
+            path = m.group(1)
+            if json.get("sha") != self.files().get(path):
+                return _response(409, {"message": "sha mismatch"})
+            sha = self._blob(base64.b64decode(json["content"]))
+            self.head = self._commit({**self.files(), path: sha}, self.head)
+            return _response(200, {"content": {"sha": sha},
+                                   "commit": {"sha": self.head,
+                                              "tree": {"sha": self.commits[self.head][0]}}})
+        if route == "":
+            return _response(200, {"default_branch": "main"})
+        if route == "/git/ref/heads/main":
+            return _response(200, {"object": {"sha": self.head}})
+        m = re.fullmatch(r"/git/commits/(\w+)", route)
+        if m:
+            return _response(200, {"tree": {"sha": self.commits[m.group(1)][0]}})
+        if route == "/git/blobs":
+            return _response(201, {"sha": self._blob(base64.b64decode(json["content"]))})
+        if route == "/git/trees":
+            files = dict(self.trees[json["base_tree"]])
+            for e in json["tree"]:
+                if e["sha"] is None:
+                    files.pop(e["path"], None)
+                else:
+                    files[e["path"]] = e["sha"]
+            return _response(201, {"sha": self._tree(files)})
+        if route == "/git/commits":
+            tree, (parent,) = json["tree"], json["parents"]
+            sha = self._sha(tree, parent, len(self.commits))
+            self.commits[sha] = (tree, parent)
+            return _response(201, {"sha": sha})
+        if route == "/git/refs/heads/main":
+            if self.commits[json["sha"]][1] != self.head:
+                return _response(422, {"message": "Update is not a fast forward"})
+            self.head = json["sha"]
+            return _response(200, {"object": {"sha": self.head}})
+        return _response(404, {"message": "Not Found"})
+
+
+def _response(status: int, body, headers: dict = None) -> requests.Response:
+    r = requests.Response()
+    r.status_code = status
+    r._content = json.dumps(body).encode()
+    r.headers.update(headers or {})
+    return r
+
+
+def _backend(monkeypatch):
+    gh = FakeGitHub()
+    be = GitHubBackend("token", REPO, api=API)
+    monkeypatch.setattr(be.session, "request", gh.request)
+    return gh, be
+
+
+def test_write_with_stale_sha_rereads_once_and_reapplies(monkeypatch):
+    gh, be = _backend(monkeypatch)
+    be.write("counter.json", {"n": 1}, "seed")
+    gh.push("counter.json", {"n": 5})               # our known sha is now stale
+    seen = []
+
+    def bump(content):
+        seen.append(content)
+        return {"n": content["n"] + 1}
+
+    gh.calls.clear()
+    be.write("counter.json", bump, "bump")
+    assert seen == [{"n": 1}, {"n": 5}]             # re-applied to the fresh content
+    assert gh.calls.count(("GET", "/contents/counter.json")) == 1
+    assert [c for c in gh.calls if c[0] == "PUT"] == [("PUT", "/contents/counter.json")] * 2
+    assert gh.stored("counter.json") == {"n": 6}
+
+
+def test_rejected_ref_update_rebases_and_recomputes(monkeypatch):
+    gh, be = _backend(monkeypatch)
+    be.commit({"log.json": {"entries": ["a"]}, "other.json": {"x": 1}}, "seed")
+    gh.push("log.json", {"entries": ["a", "replica"]})   # the branch moves under us
+    seen = []
+
+    def append(content):
+        seen.append(content)
+        return {"entries": content["entries"] + ["ours"]}
+
+    gh.calls.clear()
+    be.commit({"log.json": append, "other.json": {"x": 2}}, "append")
+    assert seen == [{"entries": ["a"]}, {"entries": ["a", "replica"]}]
+    assert gh.calls.count(("PATCH", "/git/refs/heads/main")) == 2
+    assert gh.calls.count(("GET", "/git/ref/heads/main")) == 1
+    assert gh.stored("log.json") == {"entries": ["a", "replica", "ours"]}
+    assert gh.stored("other.json") == {"x": 2}
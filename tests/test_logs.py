@@ -0,0 +1,38 @@
+"""Sharded audit log writes (LocalBackend)."""
+import github_store as gs
+from storage import LocalBackend
+
+
+def test_manifest_keeps_shards_added_by_another_process(tmp_path):
+    be = LocalBackend(str(tmp_path))
+    be.write(gs.LOG_MANIFEST_PATH, {"shards": []}, "seed")
+    entry = {"timestamp": "2026-10-17 09:00:00 UTC", "actor": "ada", "action": "X", "detail": ""}
+    changes = gs._log_shard_changes([entry], be)
+
+    other = {"path": f"{gs.LOG_DIR}/2026-10-16.json", "start": "2026-10-16 23:59:00 UTC"}
+    be.write(gs.LOG_MANIFEST_PATH, {"shards": [other]}, "another replica")
+    be.commit(changes, "flush")
+
+    manifest, _ = be.read(gs.LOG_MANIFEST_PATH)
+    assert [sh["path"] for sh in manifest["shards"]] == [
+        f"{gs.LOG_DIR}/2026-10-16.json", f"{gs.LOG_DIR}/2026-10-17.json"]
+
+
+def test_load_logs_revalidates_only_the_newest_shard(tmp_path, monkeypatch):
+    be = LocalBackend(str(tmp_path))
+    shards = [{"path": f"{gs.LOG_DIR}/2026-10-{d}.json", "start": f"2026-10-{d} 08:00:00 UTC"}
+              for d in (15, 16, 17)]
+    be.write(gs.LOG_MANIFEST_PATH, {"shards": shards}, "seed")
+    for sh in shards:
+        be.write(sh["path"], {"logs": [{"timestamp": sh["start"], "action": "X"}]}, "seed")
+    monkeypatch.setattr(gs, "_backend_obj", be)
+    read, fresh = be.read, []
+
+    def tracked(path, cached=False):
+        if not cached:
+            fresh.append(path)
+        return read(path, cached)
+
+    monkeypatch.setattr(be, "read", tracked)
+    assert len(gs.load_logs()) == 3
+    assert fresh == [gs.LOG_MANIFEST_PATH, shards[-1]["path"]]
@@ -0,0 +1,31 @@
+"""roster.read_roster_csv validation."""
+import io
+
+import pytest
+
+from roster import read_roster_csv
+
+DEPARTMENTS = ["Computer Science", "Mathematics"]
+BOOL_MAP = {"true": True, "false": False}
+
+CSV = b"""Name,Matric_Number,Jamb_Reg,Department,Olevel,School_Fees,Jamb
+Ada,20250000001,202500000001AB,Unknown,true,true,true
+Bayo,20250000001,202500000002AB,Mathematics,true,false,true
+Chi,20250000001,202500000003AB,Mathematics,true,true,true
+Dayo,20250000004,202500000003AB,Computer Science,false,true,true
+Ebi,20250000005,202500000005AB,Computer Science,true,true,true
+"""
+
+
+@pytest.mark.parametrize("chunksize", [1, 10])
+def test_duplicates_ignore_chunk_boundaries(chunksize):
+    valid, rejected = read_roster_csv(io.BytesIO(CSV), DEPARTMENTS, BOOL_MAP, chunksize)
+    # Ada's bad department leaves her Matric to Bayo; Chi repeats it, and
+    # Dayo repeats Chi's JAMB Reg even though Chi was rejected.
+    assert valid["Name"].tolist() == ["Bayo", "Ebi"]
+    assert valid["SN"].tolist() == [1, 2]
+    assert dict(zip(rejected["Row"], rejected["Errors"])) == {
+        2: "Unknown Department",
+        4: "Duplicate Matric Number",
+        5: "Duplicate JAMB Reg",
+    }
@@ -0,0 +1,7 @@
+"""search_index name handling."""
+from search_index import name_tokens
+
+
+def test_name_tokens_fold_accents():
+    assert name_tokens("Ṣọlá Adébáyọ̀") == ["sola", "adebayo"]
+    assert name_tokens("O'Brien") == ["obrien"]
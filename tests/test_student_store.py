@@ -0,0 +1,157 @@
+"""Ordering of student writes on the background writer (LocalBackend)."""
+import threading, time
+
+import pytest
+
+import github_store as gs
+from storage import LocalBackend, StorageConflict
+
+
+def _drain(timeout: float = 10.0):
+    """Wait until the writer has run everything queued, retries included."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        done = threading.Event()
+        gs._enqueue(done.set, priority=gs.PRIORITY_PREFS)
+        done.wait(max(deadline - time.monotonic(), 0))
+        if gs.sync_status()["pending"] == 0:
+            return
+        time.sleep(0.05)
+    raise AssertionError("write queue did not drain")
+
+
+@pytest.fixture
+def be(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    backend = LocalBackend(str(tmp_path / "data"))
+    backend.write(gs.STUDENTS_PATH, {"students": [{"SN": 1, "Name": "Old"}], "journal_seq": 0},
+                  "seed")
+    monkeypatch.setattr(gs, "_backend_obj", backend)
+    monkeypatch.setattr(gs, "_wal_file", None)
+    monkeypatch.setattr(gs, "_wal_live", {})
+    monkeypatch.setattr(gs, "_wal_hi", {})
+    gs._ensure_worker()
+    monkeypatch.setattr(gs, "_retry_policy", (5, 0.3, 0.3))
+    yield backend
+    _drain()
+    gs._journal_pending.clear()
+    gs._dead_letters.clear()
+    gs.flush_logs(sync=True)
+
+
+def _names(backend) -> dict:
+    students, seq, journal = gs._read_student_files(backend)
+    return {s["SN"]: s["Name"] for s in gs._replay_journal(students, journal.get("ops", []), seq)}
+
+
+def test_edit_after_retried_snapshot_survives(be, monkeypatch):
+    commit, failed = be.commit, []
+
+    def flaky(changes, msg):
+        if gs.STUDENTS_PATH in changes and not failed:
+            failed.append(msg)
+            raise StorageConflict(gs.STUDENTS_PATH)
+        return commit(changes, msg)
+
+    monkeypatch.setattr(be, "commit", flaky)
+    gs.save_students([{"SN": 1, "Name": "Imported"}, {"SN": 2, "Name": "Second"}], "ada", "import")
+    time.sleep(0.05)                      # first attempt fails and backs off
+    gs.journal_students("edit", [{"SN": 1, "Name": "Edited"}], "ada", "edit")
+    _drain()
+    assert failed
+    assert _names(be) == {1: "Edited", 2: "Second"}
+
+
+def test_clear_all_waits_for_running_write(be, monkeypatch):
+    commit, started, release = be.commit, threading.Event(), threading.Event()
+
+    def slow(changes, msg):
+        if gs.STUDENTS_JOURNAL_PATH in changes and not release.is_set():
+            started.set()
+            release.wait(5)
+        return commit(changes, msg)
+
+    monkeypatch.setattr(be, "commit", slow)
+    gs.journal_students("edit", [{"SN": 1, "Name": "Edited"}], "ada", "edit")
+    assert started.wait(5)
+    backups = []
+    clear = threading.Thread(target=lambda: backups.append(gs.clear_all_students("ada")))
+    clear.start()
+    time.sleep(0.2)
+    assert clear.is_alive()               # held until the running append commits
+    release.set()
+    clear.join(5)
+    assert _names(be) == {}               # the wipe itself is synchronous
+    _drain()                              # the backup is uploaded in the background
+    assert _names(be) == {}
+    assert [s["Name"] for s in gs.load_backup(backups[0])] == ["Edited"]
+
+
+def test_shared_students_sees_other_process_edits(be, tmp_path, monkeypatch):
+    for name, value in (("_shared_df", None), ("_shared_version", 0), ("_shared_shas", None),
+                        ("STUDENTS_CACHE_TTL", 0.0)):
+        monkeypatch.setattr(gs, name, value)
+    version, df = gs.shared_students()
+    assert df["Name"].tolist() == ["Old"]
+    assert gs.shared_students()[0] == version        # unchanged files: same version
+
+    other = LocalBackend(str(tmp_path / "data"))     # another replica's writer
+    other.write(gs.STUDENTS_JOURNAL_PATH,
+                {"seq": 1, "ops": [{"op": "edit", "SN": 1, "seq": 1,
+                                    "record": {"SN": 1, "Name": "Replica"}}]}, "edit")
+    version2, df = gs.shared_students()
+    assert version2 > version
+    assert df["Name"].tolist() == ["Replica"]
+
+
+def test_discarded_write_is_not_replayed_after_restart(be, monkeypatch):
+    commit = be.commit
+
+    def broken(changes, msg):
+        if gs.STUDENTS_PATH in changes:
+            raise ValueError("rejected")          # permanent: dead-lettered at once
+        return commit(changes, msg)
+
+    monkeypatch.setattr(be, "commit", broken)
+    gs.save_students([{"SN": 1, "Name": "Snap"}], "ada", "import")
+    _drain()
+    [letter] = gs.dead_letters()
+    gs.discard_dead_letter(letter["id"])
+    gs.journal_students("edit", [{"SN": 1, "Name": "Edited"}], "ada", "edit")
+    _drain()
+    assert _names(be) == {1: "Edited"}
+
+    monkeypatch.setattr(be, "commit", commit)     # the store accepts writes again
+    gs._wal_file.close()                          # restart: replay the WAL file
+    monkeypatch.setattr(gs, "_wal_file", None)
+    gs._wal_live.clear()
+    gs._wal_hi.clear()
+    gs._wal_replay(be)
+    _drain()
+    assert _names(be) == {1: "Edited"}
+
+
+def test_eligibility_stats_only_caches_the_published_frame(monkeypatch):
+    for name, value in (("_shared_df", None), ("_shared_version", 0), ("_stats", (None, None))):
+        monkeypatch.setattr(gs, name, value)
+    record = {"Matric_Number": "20250000001", "Jamb_Reg": "202500000001AB",
+              "Department": "Maths", "Olevel": True, "School_Fees": True, "Jamb": True}
+    live = gs.students_to_df([{"SN": 1, "Name": "Ada", **record}])
+    preview = gs.students_to_df([{"SN": n, "Name": "Import", **record} for n in range(1, 101)])
+    version = gs.publish_students(live)
+    assert gs.eligibility_stats(version, preview).total == 100
+    assert gs.eligibility_stats(version, live).total == 1
+
+
+def test_find_by_key_reads_the_frame_it_is_given(monkeypatch):
+    for name, value in (("_shared_df", None), ("_shared_version", 0),
+                        ("_key_index", (None, None, None))):
+        monkeypatch.setattr(gs, name, value)
+    rows = [{"SN": n, "Name": f"S{n}", "Matric_Number": f"2025000000{n}", "Jamb_Reg": f"20250000000{n}AB",
+             "Department": "Maths", "Olevel": True, "School_Fees": True, "Jamb": True}
+            for n in (1, 2)]
+    version = gs.publish_students(gs.students_to_df(rows))
+    assert gs.find_by_key(version, gs._shared_df, "20250000002")["Name"].tolist() == ["S2"]
+    private = gs.students_to_df(rows[1:])            # changed without a publish
+    assert gs.find_by_key(version, private, "20250000002")["Name"].tolist() == ["S2"]
+    assert gs.find_by_key(version, private, "20250000001").empty